@@ -0,0 +1,117 @@
+"""
+Raw response archive for SMP Portal scraper
+Stores every detail-report response, gzip-compressed, by date and EMIS code
+"""
+
+import gzip
+import logging
+import os
+import shutil
+from datetime import datetime, timedelta
+from typing import List, Optional
+import config
+
+logger = logging.getLogger(__name__)
+
+SUFFIX = ".html.gz"
+
+
+class ResponseArchive:
+    """Dated archive of raw detail-report responses keyed by EMIS code"""
+
+    def __init__(self, root: Optional[str] = None, day: Optional[str] = None,
+                 keep_days: Optional[int] = config.ARCHIVE_KEEP_DAYS):
+        """
+        Args:
+            root: Archive directory (defaults to config.ARCHIVE_DIR)
+            day: Archive day as YYYY-MM-DD (defaults to today)
+            keep_days: Days kept before this one; older days are pruned on the
+                first save (None = keep everything)
+        """
+        self.root = root or config.ARCHIVE_DIR
+        self.day = day or datetime.now().strftime("%Y-%m-%d")
+        self.directory = os.path.join(self.root, self.day)
+        self.keep_days = keep_days
+        self._pruned = False
+
+    def path(self, emis_code: str) -> str:
+        """Archive file path for a school"""
+        return os.path.join(self.directory, f"{emis_code}{SUFFIX}")
+
+    def save(self, emis_code: str, body: bytes) -> str:
+        """
+        Save a raw response, replacing any earlier one from the same day
+
+        Args:
+            emis_code: EMIS code of the school
+            body: Raw response body
+
+        Returns:
+            Path to the archived file
+        """
+        if not self._pruned:
+            self._pruned = True
+            self.prune()
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(emis_code)
+
+        # Write to a temp file first so a crash never leaves a truncated archive
+        tmp_path = f"{path}.tmp"
+        with gzip.open(tmp_path, 'wb', compresslevel=6) as f:
+            f.write(body)
+        os.replace(tmp_path, path)
+        return path
+
+    def load(self, emis_code: str) -> bytes:
+        """Read an archived response"""
+        with gzip.open(self.path(emis_code), 'rb') as f:
+            return f.read()
+
+    def codes(self) -> List[str]:
+        """EMIS codes archived for this day, sorted"""
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(
+            name[:-len(SUFFIX)] for name in os.listdir(self.directory) if name.endswith(SUFFIX)
+        )
+
+    def prune(self) -> int:
+        """
+        Delete archived days more than keep_days before this archive's day
+
+        Returns:
+            Number of days deleted
+        """
+        if self.keep_days is None:
+            return 0
+        try:
+            cutoff = (datetime.strptime(self.day, "%Y-%m-%d") - timedelta(days=self.keep_days)).strftime("%Y-%m-%d")
+        except ValueError:
+            return 0
+        removed = 0
+        for day in self.available_days(self.root):
+            if day >= cutoff:
+                break
+            try:
+                datetime.strptime(day, "%Y-%m-%d")
+            except ValueError:
+                continue  # not an archive day
+            try:
+                shutil.rmtree(os.path.join(self.root, day))
+                removed += 1
+            except OSError as e:
+                # e.g. another shard pruned it first
+                logger.debug(f"Could not prune archive day {day}: {e}")
+        if removed:
+            logger.info(f"Pruned {removed} archived day(s) older than {cutoff}")
+        return removed
+
+    @staticmethod
+    def available_days(root: Optional[str] = None) -> List[str]:
+        """Archived days (YYYY-MM-DD), oldest first"""
+        root = root or config.ARCHIVE_DIR
+        if not os.path.isdir(root):
+            return []
+        return sorted(
+            name for name in os.listdir(root) if os.path.isdir(os.path.join(root, name))
+        )
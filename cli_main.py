@@ -3,10 +3,33 @@ Main entry point for SMP Portal Data Extraction
 Orchestrates scraping and image generation
 """
 
+import os
 import sys
+import argparse
+from contextlib import ExitStack
 import logging
+import requests
 from scraper import SMPScraper, test_login, test_single_school
+from datetime import datetime
+from typing import Dict, List
 from data_formatter import DataFormatter
+from delta import record_changes
+from exporter import SUPPORTED_FORMATS
+from reparse import history_day, reparse_day
+from forecast import describe_anomalies, run_forecast
+from rollups import LEVELS
+from result_store import ResultStore
+from roster import Roster, read_codes_file
+from run_control import CancelToken
+from sharding import run_sharded
+from pipeline import ScrapePipeline
+from mock_portal import FaultPlan, MockPortal
+from loadtest import format_report, run_load_test
+from report_server import ReportCache, ReportServer, fetch_server_records
+from memprofile import MemoryProfiler
+from profiling import RunProfiler
+import config
+import fontcache
 
 logging.basicConfig(
     level=logging.INFO,
@@ -15,26 +38,157 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-def main():
+def _select_schools(args: argparse.Namespace, roster: Roster) -> List[Dict]:
+    """Schools chosen with --schools / --schools-file / --school-name (default: whole roster)"""
+    patterns = []
+    if args.schools:
+        patterns.extend(args.schools.split(','))
+    if args.schools_file:
+        patterns.extend(read_codes_file(args.schools_file))
+    
+    if not patterns and not args.school_name:
+        return list(roster)
+    
+    selected = {school['emis'] for school in roster.select(patterns)}
+    if args.school_name:
+        selected.update(school['emis'] for school in roster.search_name(args.school_name))
+    return roster.select(selected)
+
+
+def _build_formatter(args: argparse.Namespace) -> DataFormatter:
+    """DataFormatter configured from the command line"""
+    return DataFormatter(
+        paginate=args.paginate,
+        page_format=args.page_format,
+        rows_per_page=args.rows_per_page,
+        output_profile=args.output_profile
+    )
+
+
+def _print_output_files(formatter: DataFormatter, output_files: Dict[str, str]):
+    """Summarise the generated report files"""
+    print("="*70)
+    if output_files:
+        print(f"✓ Output files created:")
+        if 'milk' in output_files:
+            print(f"  Milk data:    {output_files['milk']}")
+        if 'biscuit' in output_files:
+            print(f"  Biscuit data: {output_files['biscuit']}")
+        if 'changes' in output_files:
+            print(f"  Changes:      {output_files['changes']}")
+        for product, pages in formatter.pages.items():
+            if len(pages) > 1:
+                print(f"  ({product}: {len(pages)} pages, {pages[0]} ... {pages[-1]})")
+        
+        # Show which files were skipped
+        if 'milk' not in output_files:
+            print(f"  ⓘ Milk data:    Skipped (no data for today)")
+        if 'biscuit' not in output_files:
+            print(f"  ⓘ Biscuit data: Skipped (no data for today)")
+    else:
+        print("⚠ No files created - no schools have data for today")
+    print("="*70 + "\n")
+
+
+def _use_mock_output():
+    """Send the result store, archive, change feed and reports of a mock run to config.MOCK_OUTPUT_DIR"""
+    config.OUTPUT_DIR = config.MOCK_OUTPUT_DIR
+    config.ARCHIVE_DIR = os.path.join(config.MOCK_OUTPUT_DIR, "archive")
+    config.RESULT_DB = os.path.join(config.MOCK_OUTPUT_DIR, "results.sqlite3")
+    print(f"Mock portal run - output goes to {config.MOCK_OUTPUT_DIR}\n")
+
+
+def main(args: argparse.Namespace) -> bool:
     """Main execution flow"""
     print("\n" + "="*70)
     print("  School Meal Program - Portal Data Extraction")
     print("="*70 + "\n")
     
     # Initialize scraper and formatter
-    scraper = SMPScraper()
-    formatter = DataFormatter()
+    token = CancelToken(args.deadline)
+    scraper = SMPScraper(token=token, base_url=args.portal_url)
+    formatter = _build_formatter(args)
+    store = ResultStore()
     
-    # Step 1: Login
-    print("[1/3] Logging in to portal...")
-    if not scraper.login():
-        print("✗ Login failed! Please check your credentials in config.py")
+    # Decide which schools to scrape
+    selection = _select_schools(args, Roster.from_config())
+    if not selection:
+        print("✗ No schools selected!")
         return False
-    print("✓ Login successful!\n")
+    targets = store.needs_refresh(selection) if args.only_stale else selection
+    if len(selection) != len(config.SCHOOLS) or args.only_stale:
+        print(f"Scraping {len(targets)} of {len(selection)} selected schools\n")
     
-    # Step 2: Scrape all schools
-    print("[2/3] Extracting data for all schools...")
-    schools_data = scraper.scrape_all_schools()
+    exporter = None
+    if args.export:
+        exporter = formatter.start_export(args.export, today_only=(args.export_scope == 'today'))
+    
+    exported = set()
+    pipeline = None
+    # Records before this run, for the change feed and for skipping unchanged responses
+    previous = store.load(school['emis'] for school in targets)
+    
+    def handle_result(result: Dict):
+        if result.get('error'):
+            # Keep the school's last good record (and its fingerprint)
+            return
+        store.save(result)
+        if exporter:
+            exporter.write_school(result)
+            exported.add(result['emis'])
+    
+    try:
+        fresh = []
+        if targets and args.from_server:
+            # Steps 1-2 done by the report server: no login or portal traffic here
+            print(f"[1-2/3] Downloading records from report server {args.from_server}...")
+            try:
+                fresh = fetch_server_records(args.from_server, targets)
+            except requests.RequestException as e:
+                print(f"✗ Could not get records from the report server: {e}")
+                print("  Check that cli_main.py --serve is running there and reachable from this machine")
+                return False
+            for result in fresh:
+                if not result.get('skipped'):
+                    handle_result(result)
+        elif targets and args.shards > 1:
+            # Steps 1-2 in worker processes; each shard logs in and writes to the shared store
+            print(f"[1-2/3] Logging in and extracting data in {args.shards} worker processes...")
+            fresh = run_sharded(targets, args.shards, store.path, token.deadline_at, args.portal_url)
+        elif targets:
+            # Step 1: Login
+            print("[1/3] Logging in to portal...")
+            if not scraper.login():
+                print("✗ Login failed! Please check your credentials in config.py")
+                return False
+            print("✓ Login successful!\n")
+            
+            # Step 2: Scrape schools (exports are written as each school arrives)
+            print("[2/3] Extracting data for all schools...")
+            # Responses identical to the stored ones are not parsed again
+            scraper.remember(previous.values())
+            if args.pipeline:
+                pipeline = ScrapePipeline(scraper, parse_workers=args.parse_workers)
+                fresh = pipeline.run(targets, on_result=handle_result)
+            else:
+                fresh = scraper.scrape_all_schools(on_result=handle_result, schools=targets)
+        else:
+            print("[1-2/3] All selected schools are up to date - nothing to scrape\n")
+        
+        # Schools that were not re-scraped are reported from their stored results
+        fetched = {school['emis']: school for school in fresh}
+        stored = store.load(school['emis'] for school in selection if school['emis'] not in fetched)
+        schools_data = []
+        for school in selection:
+            data = fetched.get(school['emis']) or stored.get(school['emis'])
+            if data is None:
+                continue
+            schools_data.append(data)
+            if exporter and school['emis'] not in exported and not data.get('skipped'):
+                exporter.write_school(data)
+    finally:
+        export_files = exporter.close() if exporter else {}
+        store.close()
     
     if not schools_data:
         print("✗ No data extracted!")
@@ -44,51 +198,354 @@ def main():
     successful = sum(1 for s in schools_data if s['milk'] or s['biscuit'])
     print(f"✓ Data extracted for {len(schools_data)} schools")
     print(f"  - {successful} schools have data")
-    print(f"  - {len(schools_data) - successful} schools missing data (will show N/A)\n")
+    not_fetched = sum(1 for s in schools_data if s.get('skipped'))
+    print(f"  - {len(schools_data) - successful - not_fetched} schools missing data (will show N/A)")
+    if not_fetched:
+        print(f"  ⚠ Deadline reached - {not_fetched} schools not fetched (marked in the report)")
+    
+    # What changed since the last run (appended to the day's change feed)
+    changes = record_changes(previous, fresh)
+    if changes:
+        print(f"  - {len(changes)} schools changed since the last run")
+    print()
+    
+    for fmt, path in export_files.items():
+        print(f"  Export ({fmt}): {path}")
+    
+    # Sharded runs transfer in the worker processes and are not counted here
+    if scraper.transfer.requests:
+        print(scraper.transfer.report() + "\n")
+    
+    if args.headless:
+        print("[3/3] Headless run - skipping image generation\n")
+        if pipeline:
+            print("Pipeline stages:")
+            print(pipeline.report() + "\n")
+        return True
     
     # Step 3: Generate images
     print("[3/3] Generating JPG images...")
-    output_files = formatter.generate_images(schools_data)
+    if pipeline:
+        output_files = pipeline.render(formatter, schools_data, token=token)
+    else:
+        output_files = formatter.generate_images(schools_data, token=token)
+    if args.change_report:
+        if previous:
+            change_report = formatter.generate_change_report(changes, schools_data)
+            if change_report:
+                output_files['changes'] = change_report
+        else:
+            print("  No previous run to compare with - skipping change report")
     print(f"✓ Image generation complete!\n")
     
-    print("="*70)
-    if output_files:
-        print(f"✓ Output files created:")
-        if 'milk' in output_files:
-            print(f"  Milk data:    {output_files['milk']}")
-        if 'biscuit' in output_files:
-            print(f"  Biscuit data: {output_files['biscuit']}")
-        
-        # Show which files were skipped
-        if 'milk' not in output_files:
-            print(f"  ⓘ Milk data:    Skipped (no data for today)")
-        if 'biscuit' not in output_files:
-            print(f"  ⓘ Biscuit data: Skipped (no data for today)")
-    else:
-        print("⚠ No files created - no schools have data for today")
+    if pipeline:
+        print("Pipeline stages:")
+        print(pipeline.report() + "\n")
+    
+    _print_output_files(formatter, output_files)
+    return True
+
+
+def reparse(args: argparse.Namespace) -> bool:
+    """Rebuild a past day's report from the response archive (no network access)"""
+    day = args.reparse
+    print("\n" + "="*70)
+    print(f"  School Meal Program - Offline Re-parse ({day})")
     print("="*70 + "\n")
     
+    report_date = datetime.strptime(day, "%Y-%m-%d")
+    formatter = _build_formatter(args)
+    
+    print("[1/2] Re-parsing archived responses...")
+    schools_data = reparse_day(day, workers=args.workers)
+    if not schools_data:
+        print(f"✗ No archived responses for {day}")
+        return False
+    print(f"✓ Re-parsed {len(schools_data)} schools\n")
+    
+    if args.export:
+        with formatter.start_export(args.export, today_only=(args.export_scope == 'today'),
+                                    report_date=report_date) as exporter:
+            for school in schools_data:
+                exporter.write_school(school)
+        for fmt, path in exporter.paths.items():
+            print(f"  Export ({fmt}): {path}")
+    
+    if args.headless:
+        print("[2/2] Headless run - skipping image generation\n")
+        return True
+    
+    print("[2/2] Generating images...")
+    output_files = formatter.generate_images(schools_data, report_date=report_date)
+    _print_output_files(formatter, output_files)
     return True
 
 
+def serve(args: argparse.Namespace):
+    """Run the local caching report server until interrupted"""
+    cache = ReportCache(ttl=args.ttl, base_url=args.portal_url)
+    server = ReportServer(cache, host=args.host, port=args.port)
+    fontcache.warm_up()  # first report request should not wait for matplotlib
+    print(f"Report server on {server.url} - JSON at /api/schools, images at /reports/milk and /reports/biscuit")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nStopped")
+
+
+def load_test(args: argparse.Namespace) -> bool:
+    """Scrape a synthetic roster from a local mock portal at several concurrency levels"""
+    print("\n" + "="*70)
+    print("  School Meal Program - Scraper Load Test (local mock portal)")
+    print("="*70 + "\n")
+    
+    # Per-school progress would drown the report
+    logging.getLogger('scraper').setLevel(logging.WARNING)
+    
+    results = run_load_test(
+        schools_count=args.mock_schools,
+        concurrency=args.concurrency,
+        faults=args.faults,
+        retry_attempts=args.retry_attempts,
+        retry_delay=args.retry_delay
+    )
+    print(format_report(results, args.faults) + "\n")
+    return bool(results) and all(result.ok for result in results)
+
+
+def _concurrency_levels(value: str) -> List[int]:
+    """Parse a comma-separated list of concurrency levels"""
+    try:
+        levels = [int(level) for level in value.split(',') if level.strip()]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected comma-separated integers, got '{value}'")
+    if not levels or min(levels) < 1:
+        raise argparse.ArgumentTypeError("concurrency levels must be 1 or more")
+    return levels
+
+
+def _fault_plan(value: str) -> FaultPlan:
+    """Parse a mock portal fault spec"""
+    try:
+        return FaultPlan.from_spec(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def forecast_report(args: argparse.Namespace) -> bool:
+    """Rank schools by days of stock left, using the full history in the response archive"""
+    report_date = datetime.strptime(args.reparse, "%Y-%m-%d") if args.reparse else None
+    print("[+] Forecasting stock-outs from archived history...")
+    history = history_day(args.reparse, workers=args.workers)
+    if not history:
+        print("✗ No archived responses to build history from (see ARCHIVE_RESPONSES in config.py)")
+        return False
+    
+    risk = run_forecast(history, report_date, args.forecast_horizon)
+    if risk.empty:
+        print(f"✓ No school runs out within {args.forecast_horizon} days and no anomalies found\n")
+        return True
+    
+    print(f"⚠ {len(risk)} school/product entries at risk (most urgent first):")
+    for row in risk.head(15).itertuples():
+        days = f"{row.days_left:5.1f} days" if row.days_left != float('inf') else "   no use "
+        flags = describe_anomalies(risk.loc[row.Index])
+        print(f"  {row.emis} {row.name[:28]:<28} {row.product:<8} {days}  {flags}")
+    if len(risk) > 15:
+        print(f"  ... and {len(risk) - 15} more")
+    
+    if not args.headless:
+        path = _build_formatter(args).generate_risk_report(risk, args.forecast_horizon, report_date)
+        if path:
+            print(f"  Risk report: {path}")
+    print()
+    return True
+
+
+def rollup_report(args: argparse.Namespace) -> bool:
+    """Print and render markaz / tehsil / district totals from the result store"""
+    report_date = datetime.strptime(args.rollup_day, "%Y-%m-%d") if args.rollup_day else datetime.now()
+    day = report_date.strftime("%Y-%m-%d")
+    store = ResultStore()
+    try:
+        summaries = {level: store.rollup_summary(level, day) for level in args.rollup_levels}
+    finally:
+        store.close()
+    
+    if not any(summaries.values()):
+        print(f"✗ No stored entries dated {day} to total up\n")
+        return False
+    
+    print(f"Area totals for {day}:")
+    for level, summary in summaries.items():
+        for row in summary:
+            print(f"  {level:<8} {row['area'][:24]:<24} {row['product']:<8} {row['schools']:>4} schools  "
+                  f"received {row['received']:>9,.0f}  consumption {row['consumption']:>9,.0f}  "
+                  f"balance {row['remaining']:>9,.0f}")
+    
+    if not args.headless:
+        for level, path in _build_formatter(args).generate_rollup_reports(summaries, report_date).items():
+            print(f"  {level.title()} report: {path}")
+    print()
+    return True
+
+
+def _rollup_levels(value: str) -> List[str]:
+    """Parse a comma-separated list of rollup levels"""
+    levels = [level.strip().lower() for level in value.split(',') if level.strip()]
+    unknown = [level for level in levels if level not in LEVELS]
+    if unknown or not levels:
+        raise argparse.ArgumentTypeError(f"levels must be among {', '.join(LEVELS)}")
+    return levels
+
+
+def _export_formats(value: str) -> List[str]:
+    """Parse a comma-separated list of export formats"""
+    formats = [f.strip().lower() for f in value.split(',') if f.strip()]
+    unknown = [f for f in formats if f not in SUPPORTED_FORMATS]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unsupported export format(s): {', '.join(unknown)}")
+    return formats
+
+
+def _archive_day(value: str) -> str:
+    """Validate an archive day (YYYY-MM-DD)"""
+    try:
+        datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected a date as YYYY-MM-DD, got '{value}'")
+    return value
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Command line options"""
+    parser = argparse.ArgumentParser(
+        description="School Meal Program - Portal Data Extraction",
+        epilog="Example: python cli_main.py --test-single-school 32120163"
+    )
+    parser.add_argument('--test-login', action='store_true', help="Test login only")
+    parser.add_argument('--test-single-school', metavar='EMIS', help="Test single school")
+    parser.add_argument('--paginate', action=argparse.BooleanOptionalAction, default=config.PAGINATE_OUTPUT,
+                        help="Split reports into fixed-height pages (--no-paginate overrides PAGINATE_OUTPUT)")
+    parser.add_argument('--page-format', choices=['jpg', 'pdf'], default=config.PAGE_FORMAT,
+                        help="Numbered JPG pages or one multi-page PDF (with --paginate)")
+    parser.add_argument('--rows-per-page', type=int, default=config.ROWS_PER_PAGE, metavar='N',
+                        help="Data rows per page (with --paginate)")
+    parser.add_argument('--output-profile', choices=sorted(config.OUTPUT_PROFILES), default=config.OUTPUT_PROFILE,
+                        help="Image encoding profile (quality, format and size budget)")
+    parser.add_argument('--export', type=_export_formats, metavar='FORMATS', default=[],
+                        help="Also write data exports: comma-separated csv,jsonl,parquet")
+    parser.add_argument('--export-scope', choices=['all', 'today'], default='all',
+                        help="Export every school's latest entry, or only today's entries")
+    parser.add_argument('--headless', action='store_true',
+                        help="Skip image rendering (use with --export)")
+    parser.add_argument('--schools', metavar='CODES',
+                        help="Only these schools: comma-separated EMIS codes, prefixes (3212016*) or patterns")
+    parser.add_argument('--schools-file', metavar='PATH',
+                        help="Only the EMIS codes/patterns listed in a file")
+    parser.add_argument('--school-name', metavar='TEXT',
+                        help="Only schools whose name contains TEXT")
+    parser.add_argument('--only-stale', action='store_true',
+                        help="Re-scrape only schools whose last result is missing or not from today")
+    parser.add_argument('--pipeline', action='store_true',
+                        help="Overlap fetching, parsing (in worker processes) and rendering")
+    parser.add_argument('--parse-workers', type=int, default=config.PARSE_WORKERS, metavar='N',
+                        help="Parser processes for --pipeline")
+    parser.add_argument('--shards', type=int, default=1, metavar='N',
+                        help="Scrape in N worker processes sharing the result store")
+    parser.add_argument('--deadline', type=float, default=config.RUN_DEADLINE, metavar='SECONDS',
+                        help="Stop fetching after SECONDS and render a partial report")
+    parser.add_argument('--profile', action='store_true',
+                        help="Profile the run: pstats per phase plus collapsed stacks for flamegraphs")
+    parser.add_argument('--memprofile', action='store_true',
+                        help="Record memory use per phase and per school (tracemalloc + RSS)")
+    parser.add_argument('--reparse', type=_archive_day, metavar='YYYY-MM-DD',
+                        help="Rebuild that day's report from archived responses (no network)")
+    parser.add_argument('--workers', type=int, default=None, metavar='N',
+                        help="Worker processes for --reparse and --forecast (default: CPU count)")
+    parser.add_argument('--change-report', action='store_true',
+                        help="Also render an image of only the schools that changed since the last run")
+    parser.add_argument('--rollups', action='store_true',
+                        help="After the run, report markaz / tehsil / district totals")
+    parser.add_argument('--rollup-levels', type=_rollup_levels, default=list(LEVELS), metavar='LEVELS',
+                        help="Comma-separated levels for --rollups (default markaz,tehsil,district)")
+    parser.add_argument('--rollup-day', type=_archive_day, metavar='YYYY-MM-DD',
+                        help="Day for --rollups (default today)")
+    parser.add_argument('--forecast', action='store_true',
+                        help="After the run, rank schools at risk of running out (history from the archive)")
+    parser.add_argument('--forecast-horizon', type=int, default=config.FORECAST_HORIZON, metavar='DAYS',
+                        help="Flag schools with fewer days of stock than this")
+    parser.add_argument('--portal-url', metavar='URL', default=None,
+                        help="Scrape this portal instead of config.PORTAL_URL (e.g. a running mock_portal.py)")
+    parser.add_argument('--serve', action='store_true',
+                        help="Run the local caching report server (scrapes at most once per --ttl)")
+    parser.add_argument('--host', default=config.SERVER_HOST, help="Interface for --serve")
+    parser.add_argument('--port', type=int, default=config.SERVER_PORT, help="Port for --serve")
+    parser.add_argument('--ttl', type=float, default=config.REPORT_TTL, metavar='SECONDS',
+                        help="Seconds --serve reuses a scrape before refreshing")
+    parser.add_argument('--from-server', metavar='URL',
+                        help="Get records from a report server instead of scraping the portal")
+    parser.add_argument('--mock-portal', action='store_true',
+                        help="Run against a local mock portal serving the configured roster")
+    parser.add_argument('--load-test', action='store_true',
+                        help="Load-test the scraper against a local mock portal and report latency percentiles")
+    parser.add_argument('--mock-schools', type=int, default=200, metavar='N',
+                        help="Synthetic schools for --load-test")
+    parser.add_argument('--concurrency', type=_concurrency_levels, default=[1, 2, 4, 8], metavar='LEVELS',
+                        help="Concurrent clients for --load-test, comma-separated (default 1,2,4,8)")
+    parser.add_argument('--faults', type=_fault_plan, default=FaultPlan(), metavar='SPEC',
+                        help="Mock portal faults, e.g. latency=0.2,jitter=0.1,419=0.02,429=0.05,5xx=0.02,drop=0.01,slow=0.05")
+    parser.add_argument('--retry-attempts', type=int, default=None, metavar='N',
+                        help="Attempts per request for --load-test (default config.RETRY_ATTEMPTS)")
+    parser.add_argument('--retry-delay', type=float, default=None, metavar='SECONDS',
+                        help="Base retry backoff for --load-test (default config.RETRY_DELAY)")
+    return parser
+
+
 if __name__ == "__main__":
-    # Check for command line arguments
-    if len(sys.argv) > 1:
-        if sys.argv[1] == "--test-login":
-            print("\n=== Testing Login ===\n")
-            test_login()
-        elif sys.argv[1] == "--test-single-school" and len(sys.argv) > 2:
-            emis_code = sys.argv[2]
-            print(f"\n=== Testing Single School: {emis_code} ===\n")
-            test_single_school(emis_code)
-        else:
-            print("Usage:")
-            print("  python main.py                              # Run full extraction")
-            print("  python main.py --test-login                 # Test login only")
-            print("  python main.py --test-single-school <EMIS>  # Test single school")
-            print("\nExample:")
-            print("  python main.py --test-single-school 32120163")
+    args = build_parser().parse_args()
+    
+    if args.test_login:
+        print("\n=== Testing Login ===\n")
+        test_login()
+    elif args.serve:
+        with ExitStack() as stack:
+            if args.mock_portal:
+                _use_mock_output()
+                args.portal_url = stack.enter_context(MockPortal(faults=args.faults)).url
+            serve(args)
+    elif args.load_test:
+        success = load_test(args)
+        sys.exit(0 if success else 1)
+    elif args.reparse:
+        success = reparse(args)
+        if success and args.forecast:
+            success = forecast_report(args)
+        sys.exit(0 if success else 1)
+    elif args.test_single_school:
+        emis_code = args.test_single_school
+        print(f"\n=== Testing Single School: {emis_code} ===\n")
+        test_single_school(emis_code)
     else:
         # Run full extraction
-        success = main()
+        with ExitStack() as stack:
+            if args.mock_portal:
+                _use_mock_output()
+                portal = stack.enter_context(MockPortal(faults=args.faults))
+                args.portal_url = portal.url
+            memory_profiler = stack.enter_context(MemoryProfiler()) if args.memprofile else None
+            run_profiler = stack.enter_context(RunProfiler()) if args.profile else None
+            success = main(args)
+            if success and args.rollups:
+                success = rollup_report(args)
+            if success and args.forecast:
+                success = forecast_report(args)
+        
+        if run_profiler:
+            run_profiler.save()
+            print(run_profiler.summary())
+            print(f"\nProfile files (pstats, collapsed stacks) saved to: {run_profiler.output_dir}")
+        if memory_profiler:
+            print(memory_profiler.report())
+            print(f"\nMemory profile saved to: {memory_profiler.save_report()}")
         sys.exit(0 if success else 1)
@@ -18,6 +18,12 @@ DISTRICT_ID = "7"  # D.G. KHAN
 TEHSIL_ID = "124"  # TAUNSA
 MARKAZ_ID = "5218"  # KOT QAISRANI MALE
 
+# Area names for rollup reports (a SCHOOLS entry may override them with
+# "markaz", "tehsil" and "district" keys)
+DISTRICT_NAME = "D.G. KHAN"
+TEHSIL_NAME = "TAUNSA"
+MARKAZ_NAME = "KOT QAISRANI MALE"
+
 # Schools to extract data from
 SCHOOLS = [
     {"emis": "32120163", "name": "GPS HAJWANI"},
@@ -38,6 +44,9 @@ SCHOOLS = [
 REQUEST_TIMEOUT = 30  # seconds
 RETRY_ATTEMPTS = 3
 RETRY_DELAY = 2  # seconds between retries
+RETRY_AFTER_MAX = 120  # longest pause honoured from a server's Retry-After, seconds
+REQUEST_DELAY = 0.5  # polite pause between schools, seconds
+RUN_DEADLINE = None  # seconds; stop fetching after this and render a partial report (None = no limit)
 
 # Output settings
 if IS_MOBILE:
@@ -47,9 +56,73 @@ if IS_MOBILE:
 else:
     OUTPUT_DIR = "output"
 
+# Matplotlib settings and font cache live in the app's own storage on devices
+# (Flet sets FLET_APP_STORAGE_DATA) and in the user cache directory elsewhere,
+# never next to the reports; fontcache.py seeds them from fonts/
+CACHE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), ".cache"),
+    "smp-app",
+)
+MPL_CONFIG_DIR = os.path.join(os.environ.get("FLET_APP_STORAGE_DATA") or CACHE_DIR, "matplotlib")
+REPORT_FONT = "DejaVu Sans"  # ships with matplotlib; other families need their .ttf in fonts/
+
+# Pipelined runs (cli_main.py --pipeline)
+PARSE_WORKERS = 1 if IS_MOBILE else min(4, os.cpu_count() or 1)  # parser processes (1 = parser thread)
+PIPELINE_QUEUE_SIZE = 8  # raw responses buffered between fetch and parse stages
+
+# Memory instrumentation in the app (the CLI uses --memprofile)
+MEMORY_PROFILE = False
+
+# Raw response archive (for offline re-parsing with cli_main.py --reparse)
+ARCHIVE_RESPONSES = True
+ARCHIVE_DIR = os.path.join(OUTPUT_DIR, "archive")
+ARCHIVE_KEEP_DAYS = 7 if IS_MOBILE else 30  # older days are deleted when the archive is written (None = keep all)
+
+# Last known result per school (for --only-stale runs)
+RESULT_DB = os.path.join(OUTPUT_DIR, "results.sqlite3")
+
+# Runs against the local mock portal (cli_main.py --mock-portal) keep their
+# result store, archive, change feed and reports here, away from real data
+MOCK_OUTPUT_DIR = os.path.join(OUTPUT_DIR, "mock")
+
+# Local report server (cli_main.py --serve) shared by office clients
+SERVER_HOST = "0.0.0.0"  # listen on the LAN; "127.0.0.1" for this machine only
+SERVER_PORT = 8765
+REPORT_TTL = 900  # seconds a scrape is served before the portal is scraped again
+REFRESH_RETRY_DELAY = 60  # seconds before retrying a failed refresh; doubles per failure up to REPORT_TTL
+FORCE_REFRESH_MIN_AGE = 60  # seconds; ?refresh=1 is ignored for a younger snapshot
+REFRESH_MAX_ERRORS = 0.5  # a refresh with more than this share of failed schools counts as failed
+SERVER_READ_TIMEOUT = 1800  # seconds --from-server waits for a reply (a cold cache scrapes the whole roster first)
+
+# Stock-out forecast (cli_main.py --forecast), built from the response archive
+FORECAST_WINDOW = 7  # calendar days averaged for the consumption rate
+FORECAST_HORIZON = 7  # flag schools with fewer reporting days of stock than this
+ANOMALY_LOOKBACK = 30  # days of entries checked for anomalies
+SPIKE_FACTOR = 3.0  # consumption above this multiple of the recent rate is a spike
+
 IMAGE_DPI = 150  # DPI for JPG output
 IMAGE_WIDTH = 16  # inches
 IMAGE_HEIGHT = 12  # inches (will auto-adjust based on data)
 
+# Paginated output for large rosters
+PAGINATE_OUTPUT = False  # Split report tables into fixed-height pages
+ROWS_PER_PAGE = 40  # data rows per page
+PAGE_FORMAT = "jpg"  # "jpg" = numbered page images, "pdf" = one multi-page file
+RENDER_WORKERS = 1 if IS_MOBILE else min(4, os.cpu_count() or 1)  # processes for page rendering
+
+# Image output profiles
+# format: "jpg", "webp" or "png" (palette); quality: 1-95 for jpg/webp;
+# progressive: progressive JPEG; colors: palette size for png;
+# max_bytes: byte budget per image (quality, then size, is reduced to fit)
+OUTPUT_PROFILES = {
+    "full": {"format": "jpg", "quality": 75, "progressive": False, "max_bytes": None},
+    "share": {"format": "jpg", "quality": 70, "progressive": True, "max_bytes": 250_000},
+    "webp": {"format": "webp", "quality": 70, "max_bytes": 150_000},
+    "palette": {"format": "png", "colors": 16, "max_bytes": None},
+}
+OUTPUT_PROFILE = "share" if IS_MOBILE else "full"
+MAKE_PREVIEWS = True  # small thumbnails for the GUI
+PREVIEW_WIDTH = 600  # pixels, matches the GUI image slot
+
 # User agent to mimic browser
 USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
@@ -3,36 +3,205 @@ Data formatter for SMP Portal scraper
 Generates JPG images from scraped data
 """
 
-# Configure matplotlib for non-GUI environments (Android, headless servers)
-import matplotlib
-matplotlib.use('Agg')  # Use non-interactive backend
-
 import pandas as pd
-import matplotlib.pyplot as plt
-from matplotlib.patches import Rectangle
+import numpy as np
 import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 from datetime import datetime
-from typing import List, Dict
+from typing import List, Dict, Optional
 import logging
 import config
+import fontcache
+import image_output
+from exporter import RecordExporter
+from delta import changed_products
+from forecast import describe_anomalies
+from run_control import CancelToken, RunCancelled
+from phases import phase
 
 logger = logging.getLogger(__name__)
 
+# Table layout shared by every report
+COLUMN_WIDTHS = [0.28, 0.14, 0.14, 0.14, 0.14, 0.16]
+# Stock-out risk table: school, product, last entry, stock, daily use, days left, flags
+RISK_COLUMN_WIDTHS = [0.26, 0.07, 0.10, 0.09, 0.09, 0.08, 0.31]
+HEADER_COLOR = '#07215C'
+ROW_COLORS = ('#f0f0f0', 'white')  # odd, even data rows
+
+# Cell text for schools not fetched before the run deadline / cancel
+NOT_FETCHED = 'NOT FETCHED'
+# Cell values highlighted in red italics
+HIGHLIGHT_VALUES = ['N/A', NOT_FETCHED]
+
+
+def _render_table_page(rows: List[List[str]], columns: List[str], title: str, generated: str,
+                       output, page_rows: Optional[int] = None, profile: Optional[str] = None,
+                       preview: bool = False, col_widths: Optional[List[float]] = None,
+                       pdf_path: Optional[str] = None) -> str:
+    """
+    Render one table page and save it
+    
+    Module-level so that pages can be rendered in worker processes. Uses the
+    object-oriented Figure API rather than pyplot, so no global figure state
+    is shared between pages.
+    
+    Args:
+        rows: Cell values, one list per row
+        columns: Column labels
+        title: Title for the page
+        generated: Generation timestamp shown under the title
+        output: Path to save the image, or an open PdfPages to append to
+        page_rows: Fixed number of rows the page is sized for (None = fit rows)
+        profile: Output profile name used to encode the image
+        preview: Also write a preview thumbnail for the GUI
+        col_widths: Relative column widths (defaults to COLUMN_WIDTHS)
+        pdf_path: Path of the PDF behind output, when it is a PdfPages
+            (the preview thumbnail is named after it)
+    
+    Returns:
+        The output path (or PdfPages object) the page was written to
+    """
+    fontcache.load_matplotlib()
+    from matplotlib.figure import Figure
+    
+    num_rows = len(rows)
+    fig_height = max(10, (page_rows or num_rows) * 0.35)
+    
+    fig = Figure(figsize=(15, fig_height))
+    ax = fig.add_subplot()
+    ax.axis('off')
+    
+    # Row background colours are applied in bulk when the table is built
+    n_cols = len(columns)
+    cell_colours = [[ROW_COLORS[i % 2]] * n_cols for i in range(num_rows)]
+    
+    table = ax.table(
+        cellText=rows,
+        colLabels=columns,
+        cellColours=cell_colours,
+        colColours=[HEADER_COLOR] * n_cols,
+        cellLoc='center',
+        loc='center',
+        colWidths=col_widths or COLUMN_WIDTHS
+    )
+    
+    # Style the table
+    table.auto_set_font_size(False)
+    table.set_fontsize(10)
+    table.scale(1, 2.2)
+    
+    # Header row
+    for j in range(n_cols):
+        cell = table[(0, j)]
+        cell.set_text_props(weight='bold', color='white', fontsize=11, ha='center')
+        cell.set_height(0.08)
+    
+    # Bold school names (first column)
+    for i in range(1, num_rows + 1):
+        table[(i, 0)].get_text().set_weight('bold')
+    
+    # Highlight N/A / not-fetched values - only the matching cells are touched
+    na_rows, na_cols = np.nonzero(np.isin(np.asarray(rows, dtype=object), HIGHLIGHT_VALUES))
+    for i, j in zip(na_rows, na_cols):
+        table[(i + 1, j)].set_text_props(color='red', style='italic')
+    
+    ax.set_title(
+        f'{title}\nGenerated: {generated}',
+        fontsize=18,
+        fontweight='bold',
+        pad=15,
+        color=HEADER_COLOR,
+        loc='center'
+    )
+    
+    # Adjust layout to bring title closer to table
+    fig.subplots_adjust(top=0.95)
+    fig.tight_layout()
+    
+    if isinstance(output, str):
+        image_output.save_figure(fig, output, profile, preview=preview)
+    else:
+        output.savefig(fig, bbox_inches='tight')
+        if preview and pdf_path:
+            image_output.save_figure_preview(fig, image_output.preview_path(pdf_path))
+    return output
+
 
 class DataFormatter:
     """Format and visualize scraped school data"""
     
-    def __init__(self):
+    def __init__(self, paginate: bool = config.PAGINATE_OUTPUT, page_format: str = config.PAGE_FORMAT,
+                 rows_per_page: int = config.ROWS_PER_PAGE, render_workers: int = config.RENDER_WORKERS,
+                 output_profile: str = config.OUTPUT_PROFILE, make_previews: bool = config.MAKE_PREVIEWS):
+        """
+        Args:
+            paginate: Split large tables into fixed-height pages
+            page_format: "jpg" for numbered page images, "pdf" for one multi-page file
+            rows_per_page: Data rows on each page when paginating
+            render_workers: Worker processes used to render image pages in parallel
+            output_profile: Name of the image output profile (see config.OUTPUT_PROFILES)
+            make_previews: Write a small preview thumbnail for each report
+        """
+        if page_format not in ('jpg', 'pdf'):
+            raise ValueError(f"Unsupported page format: {page_format}")
+        self.paginate = paginate
+        self.page_format = page_format
+        self.rows_per_page = max(1, rows_per_page)
+        self.render_workers = max(1, render_workers)
+        self.output_profile = output_profile
+        self.extension = image_output.extension(output_profile)
+        self.make_previews = make_previews
+        
+        # Every file produced per product by the last generate_images() call
+        self.pages: Dict[str, List[str]] = {}
+        # Preview thumbnail per product from the last generate_images() call
+        self.previews: Dict[str, str] = {}
+        # Cancellation token of the generate_images() call in progress
+        self._token = CancelToken()
+        
         # Ensure output directory exists
         os.makedirs(config.OUTPUT_DIR, exist_ok=True)
     
-    def _prepare_milk_dataframe(self, schools_data: List[Dict]) -> pd.DataFrame:
+    def start_export(self, formats: List[str], today_only: bool = False,
+                     output_dir: Optional[str] = None, report_date: Optional[datetime] = None) -> RecordExporter:
+        """
+        Open streaming exports of the milk and biscuit rows
+        
+        Feed each school to the returned exporter's write_school() as soon as
+        it is scraped, then close() it (or use it as a context manager).
+        
+        Args:
+            formats: Any of "csv", "jsonl", "parquet"
+            today_only: Export only rows dated today (same filter as the images)
+            output_dir: Directory for the export files (defaults to config.OUTPUT_DIR)
+            report_date: Day treated as "today" (defaults to the current date)
+        
+        Returns:
+            An open RecordExporter
+        """
+        return RecordExporter(formats, today_only=today_only, output_dir=output_dir or config.OUTPUT_DIR,
+                              report_date=report_date)
+    
+    @staticmethod
+    def _not_fetched_row(emis_name: str) -> Dict:
+        """Table row for a school that was not fetched in a partial run"""
+        return {
+            'EMIS - School Name': emis_name,
+            'Date': NOT_FETCHED,
+            'Received Quantity': '-',
+            'Present Stock': '-',
+            'Consumption': '-',
+            'Remaining Balance': '-'
+        }
+    
+    def _prepare_milk_dataframe(self, schools_data: List[Dict], report_date: Optional[datetime] = None) -> pd.DataFrame:
         """
         Convert scraped data into a DataFrame for Milk data only
         Filters to only show schools with TODAY's milk data
         
         Args:
             schools_data: List of school data dictionaries
+            report_date: Day to report on (defaults to today)
         
         Returns:
             Formatted pandas DataFrame with milk data for today only
@@ -40,12 +209,17 @@ class DataFormatter:
         rows = []
         
         # Get today's date in the same format as portal (dd-mm-yyyy)
-        today = datetime.now().strftime("%d-%m-%Y")
+        today = (report_date or datetime.now()).strftime("%d-%m-%Y")
         logger.info(f"Filtering milk data for today's date: {today}")
         
         for school in schools_data:
             emis_name = f"{school['emis']} - {school['name']}"
             
+            # Schools not fetched before a deadline/cancel are listed, clearly marked
+            if school.get('skipped'):
+                rows.append(self._not_fetched_row(emis_name))
+                continue
+            
             # Only include school if milk data exists AND matches today's date
             if school['milk'] and school['milk']['date'] == today:
                 milk_row = {
@@ -67,13 +241,14 @@ class DataFormatter:
         logger.info(f"Found {len(rows)} schools with milk data for today")
         return pd.DataFrame(rows)
     
-    def _prepare_biscuit_dataframe(self, schools_data: List[Dict]) -> pd.DataFrame:
+    def _prepare_biscuit_dataframe(self, schools_data: List[Dict], report_date: Optional[datetime] = None) -> pd.DataFrame:
         """
         Convert scraped data into a DataFrame for Biscuit data only
         Filters to only show schools with TODAY's biscuit data
         
         Args:
             schools_data: List of school data dictionaries
+            report_date: Day to report on (defaults to today)
         
         Returns:
             Formatted pandas DataFrame with biscuit data for today only
@@ -81,12 +256,17 @@ class DataFormatter:
         rows = []
         
         # Get today's date in the same format as portal (dd-mm-yyyy)
-        today = datetime.now().strftime("%d-%m-%Y")
+        today = (report_date or datetime.now()).strftime("%d-%m-%Y")
         logger.info(f"Filtering biscuit data for today's date: {today}")
         
         for school in schools_data:
             emis_name = f"{school['emis']} - {school['name']}"
             
+            # Schools not fetched before a deadline/cancel are listed, clearly marked
+            if school.get('skipped'):
+                rows.append(self._not_fetched_row(emis_name))
+                continue
+            
             # Only include school if biscuit data exists AND matches today's date
             if school['biscuit'] and school['biscuit']['date'] == today:
                 biscuit_row = {
@@ -108,7 +288,8 @@ class DataFormatter:
         logger.info(f"Found {len(rows)} schools with biscuit data for today")
         return pd.DataFrame(rows)
     
-    def _generate_single_image(self, df: pd.DataFrame, title: str, output_path: str) -> str:
+    def _generate_single_image(self, df: pd.DataFrame, title: str, output_path: str,
+                               col_widths: Optional[List[float]] = None) -> str:
         """
         Generate a single JPG image from a DataFrame
         
@@ -116,6 +297,7 @@ class DataFormatter:
             df: DataFrame with data
             title: Title for the image
             output_path: Path to save the image
+            col_widths: Relative column widths (defaults to COLUMN_WIDTHS)
         
         Returns:
             Path to the generated image file
@@ -125,130 +307,362 @@ class DataFormatter:
             logger.warning(f"No data available for {title} - skipping file creation")
             return None
         
-        # Calculate figure size based on number of rows
-        num_rows = len(df)
-        fig_height = max(10, num_rows * 0.35)
-        
-        # Create figure
-        fig, ax = plt.subplots(figsize=(15, fig_height))
-        ax.axis('off')
-        
-        # Create table
-        table = ax.table(
-            cellText=df.values,
-            colLabels=df.columns,
-            cellLoc='center',
-            loc='center',
-            colWidths=[0.28, 0.14, 0.14, 0.14, 0.14, 0.16]
-        )
+        generated = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        _render_table_page(df.values.tolist(), list(df.columns), title, generated, output_path,
+                           profile=self.output_profile, preview=self.make_previews, col_widths=col_widths)
+        return output_path
+    
+    def _generate_paged_output(self, df: pd.DataFrame, title: str, base_path: str,
+                               col_widths: Optional[List[float]] = None) -> List[str]:
+        """
+        Split a DataFrame into fixed-height pages and render them
         
-        # Style the table
-        table.auto_set_font_size(False)
-        table.set_fontsize(10)
-        table.scale(1, 2.2)
-        
-        # Style header with better formatting
-        for i in range(len(df.columns)):
-            cell = table[(0, i)]
-            cell.set_facecolor('#07215C')
-            cell.set_text_props(weight='bold', color='white', fontsize=11, ha='center')
-            cell.set_height(0.08)
-        
-        # Style data rows
-        for i in range(1, len(df) + 1):
-            for j in range(len(df.columns)):
-                cell = table[(i, j)]
-                
-                # Alternate row colors
-                if i % 2 == 1:
-                    cell.set_facecolor('#f0f0f0')
-                else:
-                    cell.set_facecolor('white')
-                
-                # Bold school names
-                if j == 0:
-                    cell.set_text_props(weight='bold')
-                
-                # Highlight N/A values
-                if df.iloc[i-1, j] == 'N/A':
-                    cell.set_text_props(color='red', style='italic')
-        
-        # Add title with better formatting
-        title_text = f'{title}\nGenerated: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}'
-        plt.title(
-            title_text,
-            fontsize=18,
-            fontweight='bold',
-            pad=15,
-            color='#07215C',
-            loc='center'
-        )
+        Image pages are written as numbered files and rendered in parallel;
+        PDF pages are appended one at a time to a single multi-page file.
+        Only one page is held in memory per worker, so render time and peak
+        memory per page do not depend on roster size.
         
-        # Adjust layout to bring title closer to table
-        plt.subplots_adjust(top=0.95)
+        Args:
+            df: DataFrame with data
+            title: Title for every page
+            base_path: Output path without page suffix (extension is replaced)
+            col_widths: Relative column widths (defaults to COLUMN_WIDTHS)
         
-        # Save the figure
-        plt.tight_layout()
-        plt.savefig(output_path, dpi=config.IMAGE_DPI, bbox_inches='tight', format='jpg')
-        plt.close()
+        Returns:
+            List of generated file paths (one PDF, or one image per page)
+        """
+        if df.empty:
+            logger.warning(f"No data available for {title} - skipping file creation")
+            return []
         
-        return output_path
+        values = df.values.tolist()
+        columns = list(df.columns)
+        pages = [values[i:i + self.rows_per_page] for i in range(0, len(values), self.rows_per_page)]
+        total = len(pages)
+        generated = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        root, _ = os.path.splitext(base_path)
+        logger.info(f"  Rendering {len(values)} rows as {total} page(s) of {self.rows_per_page}")
+        
+        if self.page_format == 'pdf':
+            fontcache.load_matplotlib()
+            from matplotlib.backends.backend_pdf import PdfPages
+            
+            pdf_path = f"{root}.pdf"
+            with PdfPages(pdf_path) as pdf:
+                for number, page_rows in enumerate(pages, start=1):
+                    self._token.check()
+                    page_title = f"{title} (Page {number}/{total})"
+                    _render_table_page(page_rows, columns, page_title, generated, pdf,
+                                       page_rows=self.rows_per_page, preview=self.make_previews and number == 1,
+                                       col_widths=col_widths, pdf_path=pdf_path)
+            return [pdf_path]
+        
+        jobs = [
+            (page_rows, columns, f"{title} (Page {number}/{total})", generated,
+             f"{root}_p{number:03d}.{self.extension}", self.rows_per_page,
+             self.output_profile, self.make_previews and number == 1, col_widths)
+            for number, page_rows in enumerate(pages, start=1)
+        ]
+        
+        if self.render_workers > 1 and total > 1:
+            with ProcessPoolExecutor(max_workers=min(self.render_workers, total)) as pool:
+                futures = [pool.submit(_render_table_page, *job) for job in jobs]
+                pending = set(futures)
+                try:
+                    while pending:
+                        self._token.check()
+                        _, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+                except RunCancelled:
+                    # Pages not yet started are dropped; only the ones in progress are waited for
+                    for future in pending:
+                        future.cancel()
+                    raise
+                return [future.result() for future in futures]
+        paths = []
+        for job in jobs:
+            self._token.check()
+            paths.append(_render_table_page(*job))
+        return paths
     
-    def generate_images(self, schools_data: List[Dict]) -> Dict[str, str]:
+    def _render_report(self, product: str, df: pd.DataFrame, title: str, output_path: str,
+                       col_widths: Optional[List[float]] = None) -> Optional[str]:
+        """
+        Render one product report as a single image or as pages
+        
+        Returns:
+            Path to the report (the PDF or first page when paginating), or None if skipped
+        """
+        with phase('render'):
+            if self.paginate:
+                paths = self._generate_paged_output(df, title, output_path, col_widths)
+            else:
+                path = self._generate_single_image(df, title, output_path, col_widths)
+                paths = [path] if path else []
+        
+        if paths:
+            self.pages[product] = paths
+            preview = image_output.preview_path(paths[0])
+            if self.make_previews and os.path.exists(preview):
+                self.previews[product] = preview
+        return paths[0] if paths else None
+    
+    def display_image(self, product: str, path: Optional[str]) -> Optional[str]:
+        """
+        Image to show for a report in the GUI
+        
+        Returns:
+            The report's preview thumbnail, else the report itself, or None
+            when it is a PDF without a preview (images cannot show PDFs)
+        """
+        image = self.previews.get(product, path)
+        if not image or image.lower().endswith('.pdf'):
+            return None
+        return image
+    
+    def generate_images(self, schools_data: List[Dict], report_date: Optional[datetime] = None,
+                        token: Optional[CancelToken] = None) -> Dict[str, str]:
         """
         Generate separate JPG images for milk and biscuit data
         
+        When paginating, the returned path is the PDF or the first page;
+        all page files are listed in self.pages and GUI thumbnails in self.previews.
+        
         Args:
             schools_data: List of school data dictionaries
+            report_date: Day to report on, e.g. when rebuilding from the archive (defaults to today)
+            token: Run cancellation token; rendering stops if the user cancels
+                (a passed deadline still renders the partial report)
         
         Returns:
             Dictionary with paths to generated images {'milk': path, 'biscuit': path}
+        
+        Raises:
+            RunCancelled if the run is cancelled while rendering
         """
         logger.info("Generating separate milk and biscuit data images...")
+        self.pages = {}
+        self.previews = {}
+        token = token or CancelToken()
+        self._token = token
         
-        timestamp = datetime.now().strftime("%Y-%m-%d")
+        timestamp = (report_date or datetime.now()).strftime("%Y-%m-%d")
+        
+        # Partial runs say so in the title
+        not_fetched = sum(1 for school in schools_data if school.get('skipped'))
+        partial = f" - PARTIAL ({not_fetched} not fetched)" if not_fetched else ""
         
         # Prepare milk DataFrame
-        milk_df = self._prepare_milk_dataframe(schools_data)
-        milk_filename = f"school_milk_data_{timestamp}.jpg"
+        with phase('prepare'):
+            milk_df = self._prepare_milk_dataframe(schools_data, report_date)
+        milk_filename = f"school_milk_data_{timestamp}.{self.extension}"
         milk_path = os.path.join(config.OUTPUT_DIR, milk_filename)
         
         # Generate milk image (only if data exists)
         logger.info("  Creating milk data image...")
-        milk_title = f"School Meal Program - Milk Data Report (Today: {timestamp})"
-        milk_result = self._generate_single_image(
+        token.check()
+        milk_title = f"School Meal Program - Milk Data Report (Today: {timestamp}){partial}"
+        milk_result = self._render_report(
+            'milk',
             milk_df,
             milk_title,
             milk_path
         )
         if milk_result:
-            logger.info(f"  Milk image saved to: {milk_path}")
+            logger.info(f"  Milk image saved to: {milk_result}")
         
         # Prepare biscuit DataFrame
-        biscuit_df = self._prepare_biscuit_dataframe(schools_data)
-        biscuit_filename = f"school_biscuit_data_{timestamp}.jpg"
+        with phase('prepare'):
+            biscuit_df = self._prepare_biscuit_dataframe(schools_data, report_date)
+        biscuit_filename = f"school_biscuit_data_{timestamp}.{self.extension}"
         biscuit_path = os.path.join(config.OUTPUT_DIR, biscuit_filename)
         
         # Generate biscuit image (only if data exists)
         logger.info("  Creating biscuit data image...")
-        biscuit_title = f"School Meal Program - Biscuit Data Report (Today: {timestamp})"
-        biscuit_result = self._generate_single_image(
+        token.check()
+        biscuit_title = f"School Meal Program - Biscuit Data Report (Today: {timestamp}){partial}"
+        biscuit_result = self._render_report(
+            'biscuit',
             biscuit_df,
             biscuit_title,
             biscuit_path
         )
         if biscuit_result:
-            logger.info(f"  Biscuit image saved to: {biscuit_path}")
+            logger.info(f"  Biscuit image saved to: {biscuit_result}")
         
         # Return only the files that were actually created
         result = {}
         if milk_result:
-            result['milk'] = milk_path
+            result['milk'] = milk_result
         if biscuit_result:
-            result['biscuit'] = biscuit_path
+            result['biscuit'] = biscuit_result
         
         return result
 
+    @staticmethod
+    def _prepare_risk_dataframe(risk: pd.DataFrame) -> pd.DataFrame:
+        """
+        Format a ranked at-risk table (forecast.at_risk) for rendering
+        
+        Args:
+            risk: Forecast rows, most urgent first
+        
+        Returns:
+            DataFrame with display strings
+        """
+        days_left = risk['days_left'].to_numpy()
+        return pd.DataFrame({
+            'EMIS - School Name': risk['emis'] + ' - ' + risk['name'],
+            'Product': risk['product'].str.title(),
+            'Last Entry': pd.to_datetime(risk['last_entry']).dt.strftime("%d-%m-%Y"),
+            'Stock Left': [f"{value:,.0f}" for value in risk['stock']],
+            'Daily Use': [f"{value:,.1f}" if value == value else 'N/A' for value in risk['rate']],
+            'Days Left': np.where(np.isfinite(days_left), np.char.mod('%.1f', days_left), '-'),
+            'Flags': risk.apply(describe_anomalies, axis=1) if len(risk) else [],
+        })
+    
+    def generate_risk_report(self, risk: pd.DataFrame, horizon: int = config.FORECAST_HORIZON,
+                             report_date: Optional[datetime] = None) -> Optional[str]:
+        """
+        Render the ranked stock-out risk table
+        
+        Args:
+            risk: Output of forecast.at_risk() (most urgent first)
+            horizon: Days-left threshold used, shown in the title
+            report_date: Day the forecast is for (defaults to today)
+        
+        Returns:
+            Path to the report (first page when paginating), or None if no school is at risk
+        """
+        if risk.empty:
+            logger.info("No school is at risk of a stock-out - skipping risk report")
+            return None
+        
+        timestamp = (report_date or datetime.now()).strftime("%Y-%m-%d")
+        with phase('prepare'):
+            df = self._prepare_risk_dataframe(risk)
+        path = os.path.join(config.OUTPUT_DIR, f"school_stock_risk_{timestamp}.{self.extension}")
+        title = (f"School Meal Program - Stock-Out Risk (under {horizon} days of stock or anomalies)"
+                 f" (Today: {timestamp})")
+        logger.info(f"  Creating stock-out risk image ({len(df)} rows)...")
+        return self._render_report('risk', df, title, path, RISK_COLUMN_WIDTHS)
+
+    @staticmethod
+    def _prepare_rollup_dataframe(summary: List[Dict]) -> pd.DataFrame:
+        """
+        Format rollup rows (ResultStore.rollup_summary) for rendering
+        
+        Args:
+            summary: Area totals for one level and day
+        
+        Returns:
+            DataFrame with one row per area and product
+        """
+        return pd.DataFrame([
+            {
+                'Area - Product': f"{row['area']} - {row['product'].title()}",
+                'Schools': str(row['schools']),
+                'Received Quantity': f"{row['received']:,.0f}",
+                'Present Stock': f"{row['present']:,.0f}",
+                'Consumption': f"{row['consumption']:,.0f}",
+                'Remaining Balance': f"{row['remaining']:,.0f}",
+            }
+            for row in summary
+        ])
+    
+    def generate_rollup_reports(self, summaries: Dict[str, List[Dict]],
+                                report_date: Optional[datetime] = None) -> Dict[str, str]:
+        """
+        Render one totals table per area level, straight from the stored rollups
+        
+        Args:
+            summaries: Level ('markaz', 'tehsil', 'district') -> rollup rows for the day
+            report_date: Day the rollups are for (defaults to today)
+        
+        Returns:
+            Dictionary of level -> report path (levels without rows are skipped)
+        """
+        timestamp = (report_date or datetime.now()).strftime("%Y-%m-%d")
+        result = {}
+        for level, summary in summaries.items():
+            with phase('prepare'):
+                df = self._prepare_rollup_dataframe(summary)
+            path = os.path.join(config.OUTPUT_DIR, f"{level}_summary_{timestamp}.{self.extension}")
+            title = f"School Meal Program - {level.title()} Totals (Today: {timestamp})"
+            logger.info(f"  Creating {level} summary image...")
+            report = self._render_report(level, df, title, path)
+            if report:
+                result[level] = report
+        return result
+
+    @staticmethod
+    def _prepare_change_dataframe(changes: List[Dict], schools_data: List[Dict]) -> pd.DataFrame:
+        """
+        Format run-to-run changes (delta.diff_records) for rendering
+        
+        One row per changed school and product. Changed cells read
+        "previous -> current"; the other cells show the current value.
+        
+        Args:
+            changes: Changed schools
+            schools_data: This run's records (for the unchanged values)
+        
+        Returns:
+            DataFrame with display strings
+        """
+        def show(value) -> str:
+            if value is None:
+                return 'N/A'
+            return f"{value:,}" if isinstance(value, int) else str(value)
+        
+        current = {school['emis']: school for school in schools_data}
+        columns = {
+            'date': 'Date',
+            'received_quantity': 'Received Quantity',
+            'present_stock': 'Present Stock',
+            'consumption': 'Consumption',
+            'remaining_balance': 'Remaining Balance',
+        }
+        rows = []
+        for change in changes:
+            for product in changed_products(change):
+                entry = (current.get(change['emis']) or {}).get(product) or {}
+                row = {'EMIS - School Name': f"{change['emis']} - {change['name']} ({product.title()})"}
+                for field, label in columns.items():
+                    diff = change['changes'].get(f"{product}.{field}")
+                    if diff is None:
+                        row[label] = entry.get(field) or 'N/A'
+                    elif diff[0] is None:
+                        row[label] = show(diff[1])
+                    else:
+                        row[label] = f"{show(diff[0])} \u2192 {show(diff[1])}"
+                rows.append(row)
+        return pd.DataFrame(rows)
+    
+    def generate_change_report(self, changes: List[Dict], schools_data: List[Dict],
+                               report_date: Optional[datetime] = None) -> Optional[str]:
+        """
+        Render only the schools that changed since the previous run
+        
+        Args:
+            changes: Output of delta.diff_records()
+            schools_data: This run's records
+            report_date: Day of the run (defaults to today)
+        
+        Returns:
+            Path to the report (first page when paginating), or None if nothing changed
+        """
+        if not changes:
+            logger.info("No changes since the last run - skipping change report")
+            return None
+        
+        timestamp = (report_date or datetime.now()).strftime("%Y-%m-%d")
+        with phase('prepare'):
+            df = self._prepare_change_dataframe(changes, schools_data)
+        path = os.path.join(config.OUTPUT_DIR, f"school_changes_{timestamp}.{self.extension}")
+        title = f"School Meal Program - Changes Since Last Run ({len(changes)} schools) (Today: {timestamp})"
+        logger.info(f"  Creating change report image ({len(df)} rows)...")
+        return self._render_report('changes', df, title, path)
+
 
 if __name__ == "__main__":
     # Test the formatter with sample data
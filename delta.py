@@ -0,0 +1,139 @@
+"""
+Run-to-run changes for SMP Portal scraper
+Compares each school's record with the one stored by the previous run and
+appends the per-field differences to a compact JSON Lines change feed
+"""
+
+import json
+import logging
+import os
+from datetime import datetime
+from typing import Dict, List, Optional
+import config
+from exporter import NUMERIC_FIELDS, PRODUCTS, to_number
+
+logger = logging.getLogger(__name__)
+
+# Compared per product, in feed order
+DIFF_FIELDS = ('date', *NUMERIC_FIELDS)
+
+
+def _values(entry: Optional[Dict]) -> Dict:
+    """A product entry's compared fields, quantities as numbers (None when missing)"""
+    entry = entry or {}
+    values = {'date': entry.get('date')}
+    for field in NUMERIC_FIELDS:
+        values[field] = to_number(entry.get(field))
+    return values
+
+
+def diff_school(previous: Optional[Dict], current: Dict) -> Dict[str, List]:
+    """
+    Fields of a school that differ between two records
+
+    Returns:
+        'product.field' -> [previous value, current value]
+    """
+    changes = {}
+    for product in PRODUCTS:
+        before = _values(previous.get(product) if previous else None)
+        after = _values(current.get(product))
+        for field in DIFF_FIELDS:
+            if before[field] != after[field]:
+                changes[f"{product}.{field}"] = [before[field], after[field]]
+    return changes
+
+
+def diff_records(previous: Dict[str, Dict], current: List[Dict]) -> List[Dict]:
+    """
+    Per-school, per-field differences between the previous run and this one
+
+    Args:
+        previous: Records of the previous run keyed by EMIS code (ResultStore.load())
+        current: This run's records; schools not fetched ('skipped') or whose
+            fetch failed ('error') are left out, as they carry no new numbers
+
+    Returns:
+        One entry per changed school, in the order of current: emis, name,
+        status ('new' if the school had no previous record, else 'changed')
+        and changes (see diff_school())
+    """
+    changed = []
+    for record in current:
+        if record.get('skipped') or record.get('error'):
+            continue
+        before = previous.get(record['emis'])
+        changes = diff_school(before, record)
+        if changes:
+            changed.append({
+                'emis': record['emis'],
+                'name': record['name'],
+                'status': 'changed' if before else 'new',
+                'changes': changes,
+            })
+    return changed
+
+
+def changed_products(change: Dict) -> List[str]:
+    """Products with at least one changed field in a diff_records() entry"""
+    return [product for product in PRODUCTS if any(key.startswith(f"{product}.") for key in change['changes'])]
+
+
+class ChangeFeed:
+    """
+    Day's change feed: one JSON object per changed school and run, appended
+
+    Each line holds run_at, emis, name, status and changes, so consumers can
+    tail the file and apply a handful of rows per poll.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        Args:
+            path: Feed file (defaults to OUTPUT_DIR/changes_YYYY-MM-DD.jsonl)
+        """
+        self.path = path or os.path.join(
+            config.OUTPUT_DIR, f"changes_{datetime.now().strftime('%Y-%m-%d')}.jsonl"
+        )
+
+    def append(self, changes: List[Dict], run_at: Optional[datetime] = None) -> int:
+        """
+        Append one run's changes
+
+        Returns:
+            Number of lines written
+        """
+        if not changes:
+            return 0
+        run_at = (run_at or datetime.now()).isoformat(timespec='seconds')
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            for change in changes:
+                f.write(json.dumps({'run_at': run_at, **change}, ensure_ascii=False, separators=(',', ':')) + "\n")
+        return len(changes)
+
+
+def record_changes(previous: Dict[str, Dict], current: List[Dict],
+                   feed: Optional[ChangeFeed] = None) -> List[Dict]:
+    """
+    Diff a run against the previous one and append the result to the change feed
+
+    Args:
+        previous: Records stored before this run, keyed by EMIS code
+        current: This run's records
+        feed: Feed to append to (defaults to today's)
+
+    Returns:
+        The changes (see diff_records())
+    """
+    changes = diff_records(previous, current)
+    feed = feed or ChangeFeed()
+    feed.append(changes)
+    new = sum(1 for change in changes if change['status'] == 'new')
+    if changes:
+        logger.info(f"{len(changes)} schools changed since the last run ({new} new) - feed: {feed.path}")
+    else:
+        logger.info("No changes since the last run")
+    return changes
@@ -0,0 +1,202 @@
+"""
+Machine-readable exports for SMP Portal scraper
+Streams milk and biscuit rows to CSV, JSON Lines and (optionally) Parquet
+"""
+
+import csv
+import json
+import logging
+import os
+from datetime import datetime
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+PRODUCTS = ('milk', 'biscuit')
+
+# Export columns, in file order
+FIELDS = [
+    'product', 'emis', 'name', 'date',
+    'received_quantity', 'present_stock', 'consumption', 'remaining_balance'
+]
+NUMERIC_FIELDS = ('received_quantity', 'present_stock', 'consumption', 'remaining_balance')
+
+SUPPORTED_FORMATS = ('csv', 'jsonl', 'parquet')
+
+# Rows buffered before a Parquet row group is written
+PARQUET_BATCH_ROWS = 500
+
+
+def to_number(value: Optional[str]) -> Optional[int]:
+    """
+    Convert a portal quantity string such as "1,431" to an int
+
+    Returns:
+        The number, or None if the value is missing or not numeric (e.g. "N/A")
+    """
+    if value is None:
+        return None
+    try:
+        return int(str(value).replace(',', '').strip())
+    except ValueError:
+        return None
+
+
+def school_rows(school: Dict, today_only: bool = False, today: Optional[str] = None) -> List[Dict]:
+    """
+    Build export rows (one per product) for a scraped school
+
+    Args:
+        school: School data dictionary from SMPScraper
+        today_only: Skip products whose latest entry is not dated today
+        today: Today's date as dd-mm-yyyy (defaults to the current date)
+
+    Returns:
+        List of row dictionaries keyed by FIELDS
+    """
+    today = today or datetime.now().strftime("%d-%m-%Y")
+    rows = []
+
+    for product in PRODUCTS:
+        data = school.get(product)
+        if not data:
+            continue
+        if today_only and data['date'] != today:
+            continue
+
+        row = {
+            'product': product,
+            'emis': school['emis'],
+            'name': school['name'],
+            'date': data['date'],
+        }
+        for field in NUMERIC_FIELDS:
+            row[field] = to_number(data.get(field))
+        rows.append(row)
+
+    return rows
+
+
+class RecordExporter:
+    """Incrementally write school rows to one or more export files"""
+
+    def __init__(self, formats: List[str], today_only: bool = False, output_dir: str = "output",
+                 report_date: Optional[datetime] = None):
+        """
+        Args:
+            formats: Any of "csv", "jsonl", "parquet"
+            today_only: Export only rows dated today
+            output_dir: Directory for the export files
+            report_date: Day treated as "today" (defaults to the current date)
+        """
+        unknown = set(formats) - set(SUPPORTED_FORMATS)
+        if unknown:
+            raise ValueError(f"Unsupported export format(s): {', '.join(sorted(unknown))}")
+
+        report_date = report_date or datetime.now()
+        self.today_only = today_only
+        self.today = report_date.strftime("%d-%m-%Y")
+        self.paths: Dict[str, str] = {}
+        self.rows_written = 0
+
+        os.makedirs(output_dir, exist_ok=True)
+        scope = "today" if today_only else "all"
+        stem = os.path.join(output_dir, f"school_data_{scope}_{report_date.strftime('%Y-%m-%d')}")
+
+        self._csv_file = None
+        self._csv_writer = None
+        self._jsonl_file = None
+        self._parquet_writer = None
+        self._parquet_buffer: List[Dict] = []
+
+        if 'csv' in formats:
+            self.paths['csv'] = f"{stem}.csv"
+            self._csv_file = open(self.paths['csv'], 'w', newline='', encoding='utf-8')
+            self._csv_writer = csv.DictWriter(self._csv_file, fieldnames=FIELDS)
+            self._csv_writer.writeheader()
+
+        if 'jsonl' in formats:
+            self.paths['jsonl'] = f"{stem}.jsonl"
+            self._jsonl_file = open(self.paths['jsonl'], 'w', encoding='utf-8')
+
+        if 'parquet' in formats:
+            try:
+                import pyarrow  # noqa: F401 - optional dependency
+                self.paths['parquet'] = f"{stem}.parquet"
+            except ImportError:
+                logger.warning("pyarrow is not installed - skipping Parquet export")
+
+    def write_school(self, school: Dict):
+        """Append the rows of one scraped school to every open export"""
+        rows = school_rows(school, self.today_only, self.today)
+        if not rows:
+            return
+
+        if self._csv_writer:
+            self._csv_writer.writerows(rows)
+            self._csv_file.flush()
+
+        if self._jsonl_file:
+            for row in rows:
+                self._jsonl_file.write(json.dumps(row, ensure_ascii=False) + "\n")
+            self._jsonl_file.flush()
+
+        if 'parquet' in self.paths:
+            self._parquet_buffer.extend(rows)
+            if len(self._parquet_buffer) >= PARQUET_BATCH_ROWS:
+                self._flush_parquet()
+
+        self.rows_written += len(rows)
+
+    def _flush_parquet(self):
+        """Write buffered rows as one Parquet row group"""
+        if not self._parquet_buffer:
+            return
+
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        schema = pa.schema(
+            [(field, pa.string()) for field in ('product', 'emis', 'name', 'date')] +
+            [(field, pa.int64()) for field in NUMERIC_FIELDS]
+        )
+        table = pa.Table.from_pylist(self._parquet_buffer, schema=schema)
+        if self._parquet_writer is None:
+            self._parquet_writer = pq.ParquetWriter(self.paths['parquet'], schema)
+        self._parquet_writer.write_table(table)
+        self._parquet_buffer = []
+
+    def close(self) -> Dict[str, str]:
+        """
+        Flush and close all exports
+
+        Returns:
+            Dictionary of format -> file path for every export written
+        """
+        if self._csv_file:
+            self._csv_file.close()
+            self._csv_file = None
+            self._csv_writer = None
+
+        if self._jsonl_file:
+            self._jsonl_file.close()
+            self._jsonl_file = None
+
+        if 'parquet' in self.paths:
+            self._flush_parquet()
+            if self._parquet_writer is not None:
+                self._parquet_writer.close()
+                self._parquet_writer = None
+            elif not os.path.exists(self.paths['parquet']):
+                # Nothing was exported - don't report a file that was never created
+                del self.paths['parquet']
+
+        logger.info(f"Exported {self.rows_written} rows to {', '.join(self.paths.values()) or 'nothing'}")
+        return dict(self.paths)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
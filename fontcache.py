@@ -0,0 +1,180 @@
+"""
+Matplotlib font cache for SMP Portal scraper
+Keeps matplotlib's settings and font cache in the app's own storage, seeds
+them from the prebuilt cache shipped in fonts/ and warms matplotlib up in
+the background, so the first report does not pay for a font scan
+"""
+
+import glob
+import logging
+import os
+import shutil
+import sys
+import threading
+import time
+from typing import List, Optional
+import config
+
+logger = logging.getLogger(__name__)
+
+# Shipped with the app: prebuilt fontlist-v*.json caches (see build_cache())
+# and any extra .ttf/.otf fonts for the report tables
+FONT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fonts')
+FONT_EXTENSIONS = ('.ttf', '.otf')
+
+_lock = threading.Lock()
+_configured = False
+_matplotlib = None
+_warm_thread: Optional[threading.Thread] = None
+
+
+def configure() -> str:
+    """
+    Point matplotlib at config.MPL_CONFIG_DIR and seed its font cache
+
+    Must run before matplotlib is first imported. An MPLCONFIGDIR already set
+    in the environment is respected. Prebuilt caches from FONT_DIR are copied
+    in once; matplotlib only reads the one matching its version.
+
+    Returns:
+        The matplotlib config directory
+    """
+    global _configured
+    with _lock:
+        directory = os.environ.get('MPLCONFIGDIR')
+        if _configured:
+            return directory
+        _configured = True
+
+        if 'matplotlib' in sys.modules:
+            logger.debug("matplotlib already imported, font cache location unchanged")
+            return directory or ''
+        if not directory:
+            directory = os.path.abspath(config.MPL_CONFIG_DIR)
+            os.environ['MPLCONFIGDIR'] = directory
+
+        try:
+            os.makedirs(directory, exist_ok=True)
+            for prebuilt in glob.glob(os.path.join(FONT_DIR, 'fontlist-v*.json')):
+                target = os.path.join(directory, os.path.basename(prebuilt))
+                if not os.path.exists(target):
+                    shutil.copyfile(prebuilt, target)
+                    logger.debug(f"Seeded font cache: {target}")
+        except OSError as e:
+            # matplotlib falls back to a temporary directory and builds its own cache
+            logger.warning(f"Could not prepare font cache in {directory}: {e}")
+        return directory
+
+
+def bundled_fonts() -> List[str]:
+    """Font files shipped in FONT_DIR"""
+    if not os.path.isdir(FONT_DIR):
+        return []
+    return sorted(
+        os.path.join(FONT_DIR, name) for name in os.listdir(FONT_DIR)
+        if name.lower().endswith(FONT_EXTENSIONS)
+    )
+
+
+def load_matplotlib():
+    """
+    Import and configure matplotlib (once per process)
+
+    Kept out of module import so that data-only (headless) runs never pay
+    for loading matplotlib. Selects the non-interactive Agg backend (Android,
+    headless servers), registers the bundled fonts and makes config.REPORT_FONT
+    the default family.
+
+    Returns:
+        The matplotlib module
+    """
+    global _matplotlib
+    if _matplotlib is not None:
+        return _matplotlib
+    configure()
+    with _lock:
+        if _matplotlib is None:
+            import matplotlib
+            matplotlib.use('Agg')
+            from matplotlib import font_manager
+            for path in bundled_fonts():
+                try:
+                    font_manager.fontManager.addfont(path)
+                except Exception as e:
+                    logger.warning(f"Skipping font {os.path.basename(path)}: {e}")
+            matplotlib.rcParams['font.family'] = config.REPORT_FONT
+            _matplotlib = matplotlib
+    return _matplotlib
+
+
+def _warm():
+    start = time.perf_counter()
+    try:
+        load_matplotlib()
+        from matplotlib import font_manager
+        from matplotlib.backends import backend_agg  # noqa: F401 (imported for its side effect)
+        from matplotlib import figure, table  # noqa: F401
+        for weight in ('normal', 'bold'):
+            font_manager.findfont(font_manager.FontProperties(family=config.REPORT_FONT, weight=weight))
+        logger.debug(f"Matplotlib ready in {time.perf_counter() - start:.2f}s")
+    except Exception as e:
+        logger.warning(f"Matplotlib warm-up failed: {e}")
+
+
+def warm_up() -> threading.Thread:
+    """
+    Import matplotlib and load (or build) its font cache in a background thread
+
+    Called at app and server start-up. A report started before it finishes
+    waits for the same import instead of repeating it.
+
+    Returns:
+        The warm-up thread
+    """
+    global _warm_thread
+    with _lock:
+        if _warm_thread is None:
+            _warm_thread = threading.Thread(target=_warm, name='matplotlib-warm-up', daemon=True)
+            _warm_thread.start()
+    return _warm_thread
+
+
+def build_cache(directory: str = FONT_DIR) -> str:
+    """
+    Write a prebuilt font cache holding only the fonts shipped with matplotlib
+
+    Run when packaging the app (python fontcache.py). matplotlib stores the
+    paths of its own fonts relative to its data directory, so the file works
+    on any install of the same matplotlib version; the build machine's system
+    fonts are left out because their paths would not exist on a phone.
+
+    Args:
+        directory: Where to write fontlist-v<version>.json
+
+    Returns:
+        Path of the cache file
+    """
+    from matplotlib import font_manager
+
+    system_fonts = font_manager.findSystemFonts
+
+    def matplotlib_fonts_only(fontpaths=None, fontext='ttf'):
+        # FontManager() asks once for its own font directories, once for the system's
+        return [] if fontpaths is None else system_fonts(fontpaths, fontext)
+
+    font_manager.findSystemFonts = matplotlib_fonts_only
+    try:
+        manager = font_manager.FontManager()
+    finally:
+        font_manager.findSystemFonts = system_fonts
+
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"fontlist-v{font_manager.FontManager.__version__}.json")
+    font_manager.json_dump(manager, path)
+    logger.info(f"Font cache with {len(manager.ttflist)} TrueType and {len(manager.afmlist)} AFM fonts: {path}")
+    return path
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s - %(message)s')
+    print(build_cache())
@@ -0,0 +1,324 @@
+"""
+Stock-out forecasting for SMP Portal scraper
+Lays every school's date-wise history out as dense NumPy arrays (schools x
+days) and computes consumption rates, days of stock left and bookkeeping
+anomalies for the whole roster at once
+"""
+
+import csv
+import io
+import logging
+from datetime import datetime
+from operator import itemgetter
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+import config
+
+logger = logging.getLogger(__name__)
+
+PRODUCTS = ('milk', 'biscuit')
+
+# Summary table field -> array name
+FIELDS = {
+    'received_quantity': 'received',
+    'present_stock': 'present',
+    'consumption': 'consumption',
+    'remaining_balance': 'remaining',
+}
+
+# Quantities further apart than this count as a mismatch
+TOLERANCE = 0.5
+
+# Anomaly kind -> label used in the at-risk table
+ANOMALY_LABELS = {
+    'over': 'use > stock',
+    'balance': 'balance mismatch',
+    'carry': 'carry-over mismatch',
+    'spike': 'usage spike',
+    'negative': 'negative value',
+}
+
+_EPOCH = np.datetime64('1970-01-01', 'D')
+
+
+def _parse_rows(rows: List[Dict]) -> Dict[str, np.ndarray]:
+    """
+    Convert table rows to columns: 'day' (days since 1970-01-01, -1 if the
+    date is unparseable) and one float32 array per FIELDS entry (NaN if not a number)
+
+    The strings are handed to pandas' C CSV parser in one go (it understands
+    "1,431" thousands separators), which is far faster than converting
+    millions of cells one by one.
+    """
+    fields = list(FIELDS)
+    cells = itemgetter('date', *fields)
+    text = "\n".join(["\t".join(cells(row)) for row in rows])
+    frame = pd.read_csv(io.StringIO(text), sep='\t', header=None, names=['date', *fields], dtype={'date': str},
+                        thousands=',', quoting=csv.QUOTE_NONE, skip_blank_lines=False) if rows else \
+        pd.DataFrame(columns=['date', *fields])
+
+    columns = {}
+    for field, name in FIELDS.items():
+        values = frame[field]
+        if not pd.api.types.is_numeric_dtype(values):
+            # Some cells were not numbers (e.g. "-"); convert what can be converted
+            values = pd.to_numeric(values.str.replace(',', '', regex=False), errors='coerce')
+        columns[name] = values.to_numpy(dtype=np.float32)
+
+    # A roster shares a few hundred distinct dates - parse each one once
+    codes, unique_dates = pd.factorize(frame['date'])
+    days = pd.to_datetime(pd.Series(unique_dates, dtype=object), format='%d-%m-%Y', errors='coerce')
+    days = days.to_numpy(dtype='datetime64[D]')
+    unique_days = np.append(np.where(np.isnat(days), -1, (days - _EPOCH).astype(np.int64)), -1)
+    # factorize() gives missing dates code -1, which picks the trailing -1
+    columns['day'] = unique_days[codes]
+    return columns
+
+
+class HistoryMatrix:
+    """
+    Per-product history arrays for a roster
+
+    arrays[product][name] is a float32 array of shape (schools, days) with
+    NaN where a school has no entry; column 0 is self.start. Several entries
+    on one day are merged (quantities received and consumed are summed, the
+    present stock is the day's opening stock plus everything received and
+    the last remaining balance is kept).
+    """
+
+    def __init__(self, codes: List[str], names: List[str], start: np.datetime64,
+                 arrays: Dict[str, Dict[str, np.ndarray]]):
+        self.codes = codes
+        self.names = names
+        self.start = start
+        self.arrays = arrays
+
+    @property
+    def days(self) -> int:
+        any_product = next(iter(self.arrays.values()))
+        return any_product['consumption'].shape[1]
+
+    def date(self, column: int) -> datetime:
+        """Calendar date of a column"""
+        return (self.start + np.timedelta64(int(column), 'D')).astype(datetime)
+
+    def column(self, day: datetime) -> int:
+        """Column of a calendar date (may be outside 0..days-1)"""
+        return int((np.datetime64(day.date(), 'D') - self.start).astype(np.int64))
+
+    @classmethod
+    def from_records(cls, records: List[Dict]) -> 'HistoryMatrix':
+        """
+        Build the arrays from history records
+
+        Args:
+            records: Dictionaries from scraper.parse_school_history
+                ('milk' and 'biscuit' are lists of table rows, oldest first)
+        """
+        codes = [record['emis'] for record in records]
+        names = [record['name'] for record in records]
+        n = len(records)
+
+        # Flatten every product's rows into parallel columns
+        flat = {}
+        for product in PRODUCTS:
+            counts = np.fromiter((len(record.get(product) or []) for record in records), np.int64, n)
+            rows = [row for record in records for row in (record.get(product) or [])]
+            flat[product] = _parse_rows(rows)
+            flat[product]['school'] = np.repeat(np.arange(n), counts)
+
+        known = np.concatenate([f['day'][f['day'] >= 0] for f in flat.values()])
+        first, last = (int(known.min()), int(known.max())) if known.size else (0, 0)
+        width = last - first + 1
+
+        arrays = {}
+        for product, f in flat.items():
+            keep = f['day'] >= 0
+            school, day = f['school'][keep], f['day'][keep] - first
+            product_arrays = {}
+
+            # A day's first and last entry (np.unique returns first occurrences)
+            key = school * width + day
+            _, first_entry = np.unique(key, return_index=True)
+            _, last_from_end = np.unique(key[::-1], return_index=True)
+            last_entry = len(key) - 1 - last_from_end
+
+            # Flows are summed over a day's entries
+            has_entry = np.zeros((n, width), dtype=bool)
+            has_entry[school, day] = True
+            for name in ('received', 'consumption'):
+                total = np.zeros((n, width), dtype=np.float32)
+                np.add.at(total, (school, day), np.nan_to_num(f[name][keep]))
+                total[~has_entry] = np.nan
+                product_arrays[name] = total
+
+            # Stocks: the opening stock (first entry's present stock less what it
+            # received) plus everything received that day, so present, received,
+            # consumption and remaining balance add up like a single entry
+            at = school[first_entry], day[first_entry]
+            opening = f['present'][keep][first_entry] - np.nan_to_num(f['received'][keep][first_entry])
+            present = np.full((n, width), np.nan, dtype=np.float32)
+            present[at] = opening + product_arrays['received'][at]
+            # ... and the closing balance (last entry)
+            remaining = np.full((n, width), np.nan, dtype=np.float32)
+            remaining[school[last_entry], day[last_entry]] = f['remaining'][keep][last_entry]
+            product_arrays['present'] = present
+            product_arrays['remaining'] = remaining
+            arrays[product] = product_arrays
+
+        start = _EPOCH + np.timedelta64(first, 'D')
+        logger.info(f"History matrix: {n} schools x {width} days ({sum(len(f['day']) for f in flat.values())} rows)")
+        return cls(codes, names, start, arrays)
+
+
+def _rolling_rate(consumption: np.ndarray, valid: np.ndarray, window: int) -> np.ndarray:
+    """
+    Average consumption per reported day over the last window calendar days
+
+    Computed for every (school, day) at once with cumulative sums.
+    """
+    n, width = consumption.shape
+    sums = np.zeros((n, width + 1), dtype=np.float64)
+    np.cumsum(np.where(valid, consumption, 0), axis=1, out=sums[:, 1:])
+    counts = np.zeros((n, width + 1), dtype=np.int64)
+    np.cumsum(valid, axis=1, out=counts[:, 1:])
+
+    end = np.arange(1, width + 1)
+    begin = np.maximum(0, end - window)
+    window_sum = sums[:, end] - sums[:, begin]
+    window_count = counts[:, end] - counts[:, begin]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(window_count > 0, window_sum / window_count, np.nan)
+
+
+def _previous_entry(values: np.ndarray, valid: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Each cell's value on the school's previous reported day, and whether there was one"""
+    n, width = values.shape
+    index = np.where(valid, np.arange(width), -1)
+    np.maximum.accumulate(index, axis=1, out=index)
+    previous = np.full((n, width), -1, dtype=index.dtype)
+    previous[:, 1:] = index[:, :-1]
+    has_previous = previous >= 0
+    return np.take_along_axis(values, np.maximum(previous, 0), axis=1), has_previous
+
+
+def anomaly_masks(a: Dict[str, np.ndarray], rate: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Boolean (schools x days) masks of suspicious entries
+
+    over: consumed more than the stock present; balance: present - consumption
+    != remaining; carry: present != previous remaining + received; spike:
+    consumption above config.SPIKE_FACTOR x the preceding rolling rate;
+    negative: any negative quantity.
+    """
+    valid = ~np.isnan(a['consumption'])
+    received = np.nan_to_num(a['received'])
+    previous_remaining, has_previous = _previous_entry(a['remaining'], valid)
+    previous_rate = np.full_like(rate, np.nan)
+    previous_rate[:, 1:] = rate[:, :-1]
+
+    with np.errstate(invalid='ignore'):
+        return {
+            'over': valid & (a['consumption'] > a['present'] + TOLERANCE),
+            'balance': valid & (np.abs(a['present'] - a['consumption'] - a['remaining']) > TOLERANCE),
+            'carry': valid & has_previous & (np.abs(a['present'] - previous_remaining - received) > TOLERANCE),
+            'spike': valid & (previous_rate > 0) & (a['consumption'] > config.SPIKE_FACTOR * previous_rate),
+            'negative': valid & ((a['consumption'] < 0) | (a['remaining'] < 0) | (a['present'] < 0)),
+        }
+
+
+def forecast(matrix: HistoryMatrix, report_date: Optional[datetime] = None,
+             window: int = config.FORECAST_WINDOW,
+             lookback: int = config.ANOMALY_LOOKBACK) -> pd.DataFrame:
+    """
+    Stock-out forecast and anomaly counts for every school and product
+
+    Args:
+        matrix: History arrays
+        report_date: Day the forecast is for (defaults to today)
+        window: Calendar days averaged for the consumption rate
+        lookback: Only anomalies from the last lookback days are counted
+
+    Returns:
+        DataFrame with one row per school and product that has history:
+        emis, name, product, last_entry, stock, rate, days_left (inf when
+        nothing is being consumed), run_out, anomalies and one count column
+        per anomaly kind
+    """
+    report_date = report_date or datetime.now()
+    first_recent = matrix.column(report_date) - lookback + 1
+    recent = np.arange(matrix.days) >= first_recent
+    rows = np.arange(len(matrix.codes))
+
+    frames = []
+    for product in PRODUCTS:
+        a = matrix.arrays[product]
+        valid = ~np.isnan(a['consumption'])
+        has_history = valid.any(axis=1)
+        if not has_history.any():
+            continue
+
+        rate = _rolling_rate(a['consumption'], valid, window)
+        masks = anomaly_masks(a, rate)
+
+        # Each school's latest reported day
+        last = matrix.days - 1 - np.argmax(valid[:, ::-1], axis=1)
+        stock = a['remaining'][rows, last].astype(np.float64)
+        latest_rate = rate[rows, last]
+        days_left = np.full(len(rows), np.inf)
+        np.divide(np.maximum(stock, 0), latest_rate, out=days_left, where=latest_rate > 0)
+
+        last_dates = matrix.start + last.astype('timedelta64[D]')
+        # Days left count reporting days; spread them over the calendar from the last entry
+        run_out = last_dates + np.where(np.isfinite(days_left), np.ceil(days_left), 0).astype('timedelta64[D]')
+
+        counts = {kind: (mask & recent).sum(axis=1) for kind, mask in masks.items()}
+        frame = pd.DataFrame({
+            'emis': matrix.codes,
+            'name': matrix.names,
+            'product': product,
+            'last_entry': last_dates,
+            'stock': stock,
+            'rate': latest_rate,
+            'days_left': days_left,
+            'run_out': np.where(np.isfinite(days_left), run_out, np.datetime64('NaT')),
+            **counts,
+        })
+        frame['anomalies'] = sum(counts.values())
+        frames.append(frame[has_history])
+
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True)
+
+
+def at_risk(forecasts: pd.DataFrame, horizon: int = config.FORECAST_HORIZON) -> pd.DataFrame:
+    """
+    Schools that run out within horizon reporting days or have recent anomalies
+
+    Ranked by days left, then by number of anomalies.
+    """
+    if forecasts.empty:
+        return forecasts
+    risky = forecasts[(forecasts['days_left'] <= horizon) | (forecasts['anomalies'] > 0)]
+    return risky.sort_values(['days_left', 'anomalies', 'emis'], ascending=[True, False, True]).reset_index(drop=True)
+
+
+def describe_anomalies(row) -> str:
+    """'balance mismatch x2, usage spike' style summary of a forecast row"""
+    parts = []
+    for kind, label in ANOMALY_LABELS.items():
+        count = int(row[kind])
+        if count:
+            parts.append(label if count == 1 else f"{label} x{count}")
+    return ", ".join(parts)
+
+
+def run_forecast(records: List[Dict], report_date: Optional[datetime] = None,
+                 horizon: int = config.FORECAST_HORIZON) -> pd.DataFrame:
+    """History records -> ranked at-risk table (see forecast() and at_risk())"""
+    if not records:
+        return pd.DataFrame()
+    matrix = HistoryMatrix.from_records(records)
+    return at_risk(forecast(matrix, report_date), horizon)
@@ -1,12 +1,19 @@
 import flet as ft
 import logging
 import threading
+from contextlib import ExitStack
 import os
 import time
 from datetime import datetime
 from scraper import SMPScraper
 from data_formatter import DataFormatter
+from delta import record_changes
+from run_control import CancelToken, RunCancelled
+from memprofile import MemoryProfiler, peak_rss
+from profiling import RunProfiler
+from result_store import ResultStore
 import config
+import fontcache
 
 # Custom logging handler to redirect logs to the GUI
 class GUIHandler(logging.Handler):
@@ -40,9 +47,12 @@ def main(page: ft.Page):
 
     milk_image = ft.Image(src="", width=600, visible=False, fit=ft.ImageFit.CONTAIN)
     biscuit_image = ft.Image(src="", width=600, visible=False, fit=ft.ImageFit.CONTAIN)
+    # Only the schools that changed since the previous run
+    changes_image = ft.Image(src="", width=600, visible=False, fit=ft.ImageFit.CONTAIN)
     
     image_container = ft.Column([
         ft.Text("Generated Reports:", size=18, weight=ft.FontWeight.BOLD, visible=False),
+        changes_image,
         milk_image,
         biscuit_image
     ], horizontal_alignment=ft.CrossAxisAlignment.CENTER)
@@ -59,21 +69,50 @@ def main(page: ft.Page):
     logger.addHandler(handler)
     logger.setLevel(logging.INFO)
 
+    # Load matplotlib and its font cache while the user is still on the start screen
+    fontcache.warm_up()
+
+    # Token of the run in progress (None when idle); 'profile' is the hidden CPU-profiling toggle
+    current_run = {'token': None, 'profile': False}
+
+    def toggle_profiling(e):
+        # Hidden toggle: long-press the school icon in the header
+        current_run['profile'] = not current_run['profile']
+        state = "enabled" if current_run['profile'] else "disabled"
+        page.snack_bar = ft.SnackBar(ft.Text(f"Profiling {state} for the next run"))
+        page.snack_bar.open = True
+        page.update()
+
+    def cancel_extraction(e):
+        token = current_run['token']
+        if token:
+            token.cancel()
+            btn_cancel.disabled = True
+            status_text.value = "Cancelling..."
+            status_text.color = ft.colors.ORANGE
+            page.update()
+
     def run_extraction(e):
+        token = CancelToken(config.RUN_DEADLINE)
+        current_run['token'] = token
         btn_run.disabled = True
+        btn_cancel.disabled = False
         progress_bar.visible = True
         status_text.value = "Starting extraction..."
         status_text.color = ft.colors.BLUE
         log_column.controls.clear()
         milk_image.visible = False
         biscuit_image.visible = False
+        changes_image.visible = False
         image_container.controls[0].visible = False
         page.update()
 
         def work():
+            store = None
             try:
-                scraper = SMPScraper()
+                scraper = SMPScraper(token=token)
                 formatter = DataFormatter()
+                store = ResultStore()
 
                 logging.info("[1/3] Logging in...")
                 if not scraper.login():
@@ -82,7 +121,13 @@ def main(page: ft.Page):
                     return
 
                 logging.info("[2/3] Extracting data...")
-                schools_data = scraper.scrape_all_schools()
+                # Schools whose page is unchanged since the last run are not parsed again
+                previous = store.load()
+                scraper.remember(previous.values())
+                schools_data = scraper.scrape_all_schools(on_result=store.save)
+                logging.info(scraper.transfer.summary())
+                changes = record_changes(previous, schools_data)
+                token.check()
                 
                 if not schools_data:
                     status_text.value = "No data found!"
@@ -90,17 +135,31 @@ def main(page: ft.Page):
                     return
 
                 logging.info("[3/3] Generating images...")
-                output_files = formatter.generate_images(schools_data)
+                output_files = formatter.generate_images(schools_data, token=token)
+                if previous and changes:
+                    changes_report = formatter.generate_change_report(changes, schools_data)
+                    changes_src = formatter.display_image('changes', changes_report)
+                    if changes_src:
+                        changes_image.src = changes_src
+                        changes_image.visible = True
+                        image_container.controls[0].visible = True
+                not_fetched = sum(1 for s in schools_data if s.get('skipped'))
                 
                 if output_files:
-                    status_text.value = "Check complete! Reports generated."
-                    status_text.color = ft.colors.GREEN
+                    if not_fetched:
+                        status_text.value = f"Time limit reached - partial report ({not_fetched} schools not fetched)."
+                        status_text.color = ft.colors.ORANGE
+                    else:
+                        status_text.value = "Check complete! Reports generated."
+                        status_text.color = ft.colors.GREEN
                     
-                    if 'milk' in output_files:
-                        milk_image.src = output_files['milk']
+                    milk_src = formatter.display_image('milk', output_files.get('milk'))
+                    if milk_src:
+                        milk_image.src = milk_src
                         milk_image.visible = True
-                    if 'biscuit' in output_files:
-                        biscuit_image.src = output_files['biscuit']
+                    biscuit_src = formatter.display_image('biscuit', output_files.get('biscuit'))
+                    if biscuit_src:
+                        biscuit_image.src = biscuit_src
                         biscuit_image.visible = True
                     
                     image_container.controls[0].visible = True
@@ -108,17 +167,42 @@ def main(page: ft.Page):
                     status_text.value = "Task finished, but no data for today."
                     status_text.color = ft.colors.BLUE_GREY
 
+            except RunCancelled:
+                logging.warning("Run cancelled by user")
+                status_text.value = "Cancelled."
+                status_text.color = ft.colors.BLUE_GREY
+
             except Exception as ex:
                 logging.error(f"Error: {str(ex)}")
                 status_text.value = f"Error: {str(ex)}"
                 status_text.color = ft.colors.RED
             
             finally:
+                if store:
+                    store.close()
+                current_run['token'] = None
                 btn_run.disabled = False
+                btn_cancel.disabled = True
                 progress_bar.visible = False
                 page.update()
 
-        threading.Thread(target=work, daemon=True).start()
+        profile_run = current_run['profile']
+
+        def profiled_work():
+            # Memory instrumentation (config.MEMORY_PROFILE) and/or CPU profiling (hidden toggle)
+            with ExitStack() as stack:
+                memory_profiler = stack.enter_context(MemoryProfiler(snapshots=False)) if config.MEMORY_PROFILE else None
+                run_profiler = stack.enter_context(RunProfiler()) if profile_run else None
+                work()
+            if memory_profiler:
+                logging.info(f"Peak RSS: {peak_rss() // (1024 * 1024) if peak_rss() else 'n/a'} MB")
+                logging.info(f"Memory profile saved to: {memory_profiler.save_report()}")
+            if run_profiler:
+                run_profiler.save()
+                logging.info(f"CPU profile saved to: {run_profiler.output_dir}")
+
+        instrumented = config.MEMORY_PROFILE or profile_run
+        threading.Thread(target=profiled_work if instrumented else work, daemon=True).start()
 
     btn_run = ft.ElevatedButton(
         "Run Data Extraction", 
@@ -131,16 +215,26 @@ def main(page: ft.Page):
         )
     )
 
+    btn_cancel = ft.OutlinedButton(
+        "Cancel",
+        icon=ft.icons.STOP,
+        on_click=cancel_extraction,
+        disabled=True
+    )
+
     # Layout
     page.add(
         ft.Column([
             ft.Row([
-                ft.Icon(ft.icons.SCHOOL, color=ft.colors.BLUE, size=40),
+                ft.Container(
+                    ft.Icon(ft.icons.SCHOOL, color=ft.colors.BLUE, size=40),
+                    on_long_press=toggle_profiling
+                ),
                 ft.Text("SMP Portal Extraction", size=28, weight=ft.FontWeight.BOLD),
             ], alignment=ft.MainAxisAlignment.CENTER),
             ft.Divider(),
             ft.Container(height=10),
-            ft.Row([btn_run], alignment=ft.MainAxisAlignment.CENTER),
+            ft.Row([btn_run, btn_cancel], alignment=ft.MainAxisAlignment.CENTER),
             ft.Container(height=10),
             ft.Row([status_text], alignment=ft.MainAxisAlignment.CENTER),
             ft.Row([progress_bar], alignment=ft.MainAxisAlignment.CENTER),
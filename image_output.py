@@ -0,0 +1,203 @@
+"""
+Output profiles for report images
+Encodes rendered reports as JPEG, WebP or palette PNG within a byte budget
+and writes small preview thumbnails for the GUI
+"""
+
+import io
+import logging
+import os
+from typing import Dict, Optional
+from PIL import Image
+import config
+
+logger = logging.getLogger(__name__)
+
+# File extension written for each profile format
+EXTENSIONS = {'jpg': 'jpg', 'webp': 'webp', 'png': 'png'}
+
+# Lowest quality tried when shrinking a file to fit its byte budget
+MIN_QUALITY = 30
+
+# Largest width or height the WebP format can store, in pixels
+WEBP_MAX_SIZE = 16383
+
+
+def get_profile(name: Optional[str] = None) -> Dict:
+    """
+    Look up an output profile from config
+
+    Args:
+        name: Profile name (defaults to config.OUTPUT_PROFILE)
+
+    Returns:
+        Profile settings dictionary
+    """
+    name = name or config.OUTPUT_PROFILE
+    if name not in config.OUTPUT_PROFILES:
+        raise ValueError(f"Unknown output profile: {name}")
+    profile = config.OUTPUT_PROFILES[name]
+    if profile.get('format', 'jpg') not in EXTENSIONS:
+        raise ValueError(f"Unsupported image format in profile '{name}': {profile['format']}")
+    return profile
+
+
+def extension(profile_name: Optional[str] = None) -> str:
+    """File extension for images written with a profile"""
+    return EXTENSIONS[get_profile(profile_name).get('format', 'jpg')]
+
+
+def preview_path(image_path: str) -> str:
+    """Path of the preview thumbnail for an image"""
+    root, _ = os.path.splitext(image_path)
+    return f"{root}_preview.jpg"
+
+
+def _encode(image: Image.Image, profile: Dict, quality: int) -> bytes:
+    """Encode an image once with the given quality"""
+    fmt = profile.get('format', 'jpg')
+    buffer = io.BytesIO()
+
+    if fmt == 'jpg':
+        image.convert('RGB').save(
+            buffer, format='JPEG', quality=quality, optimize=True,
+            progressive=profile.get('progressive', False)
+        )
+    elif fmt == 'webp':
+        image.convert('RGB').save(buffer, format='WEBP', quality=quality, method=4)
+    else:
+        # Report tables use a handful of flat colours, so a small palette is lossless in practice
+        colors = profile.get('colors', 16)
+        image.convert('RGB').quantize(colors=colors).save(buffer, format='PNG', optimize=True)
+
+    return buffer.getvalue()
+
+
+def encode_image(image: Image.Image, profile: Dict) -> bytes:
+    """
+    Encode an image with a profile, staying within its byte budget if it has one
+
+    Quality is lowered first (binary search down to MIN_QUALITY); if the file is
+    still too large the image is downscaled until it fits. WebP images larger
+    than WEBP_MAX_SIZE on either side are scaled down to fit first.
+
+    Args:
+        image: Rendered report image
+        profile: Output profile settings
+
+    Returns:
+        Encoded file contents
+    """
+    quality = profile.get('quality', 75)
+    max_bytes = profile.get('max_bytes')
+
+    if profile.get('format', 'jpg') == 'webp' and max(image.size) > WEBP_MAX_SIZE:
+        scale = WEBP_MAX_SIZE / max(image.size)
+        size = (max(1, int(image.width * scale)), max(1, int(image.height * scale)))
+        logger.warning(f"Image is {image.width}x{image.height}, over the WebP limit of {WEBP_MAX_SIZE} pixels - "
+                       f"scaled to {size[0]}x{size[1]} (use --paginate for large rosters)")
+        image = image.resize(size, Image.LANCZOS)
+
+    data = _encode(image, profile, quality)
+
+    if not max_bytes or len(data) <= max_bytes:
+        return data
+
+    # Binary search for the highest quality that fits (palette PNG has no quality knob)
+    if profile.get('format', 'jpg') != 'png':
+        low, high = MIN_QUALITY, quality - 1
+        best = None
+        while low <= high:
+            mid = (low + high) // 2
+            candidate = _encode(image, profile, mid)
+            if len(candidate) <= max_bytes:
+                best, low = candidate, mid + 1
+            else:
+                high = mid - 1
+        if best is not None:
+            return best
+        quality = MIN_QUALITY
+
+    # Still too large - shrink the image
+    for _ in range(5):
+        scale = max(0.3, (max_bytes / len(data)) ** 0.5 * 0.95)
+        size = (max(1, int(image.width * scale)), max(1, int(image.height * scale)))
+        image = image.resize(size, Image.LANCZOS)
+        data = _encode(image, profile, quality)
+        if len(data) <= max_bytes:
+            break
+
+    if len(data) > max_bytes:
+        logger.warning(f"Image is {len(data)} bytes, over the {max_bytes} byte budget")
+    return data
+
+
+def save_figure(fig, output_path: str, profile_name: Optional[str] = None, preview: bool = False) -> str:
+    """
+    Render a matplotlib figure and save it with an output profile
+
+    Args:
+        fig: Figure to save
+        output_path: Destination path (extension should match the profile)
+        profile_name: Output profile (defaults to config.OUTPUT_PROFILE)
+        preview: Also write a preview thumbnail next to the image
+
+    Returns:
+        Path to the saved image
+    """
+    profile = get_profile(profile_name)
+
+    # Render losslessly once; all encoding decisions are made by Pillow
+    buffer = io.BytesIO()
+    fig.savefig(buffer, dpi=config.IMAGE_DPI, bbox_inches='tight', format='png',
+                pil_kwargs={'compress_level': 1})
+    buffer.seek(0)
+
+    with Image.open(buffer) as image:
+        image.load()
+        data = encode_image(image, profile)
+        with open(output_path, 'wb') as f:
+            f.write(data)
+
+        if preview:
+            save_preview(image, preview_path(output_path))
+
+    return output_path
+
+
+def save_figure_preview(fig, output_path: str) -> str:
+    """
+    Write only the preview thumbnail of a figure (for pages saved to a PDF)
+
+    Args:
+        fig: Figure to preview
+        output_path: Destination path (see preview_path())
+
+    Returns:
+        Path to the saved thumbnail
+    """
+    buffer = io.BytesIO()
+    fig.savefig(buffer, dpi=config.IMAGE_DPI, bbox_inches='tight', format='png',
+                pil_kwargs={'compress_level': 1})
+    buffer.seek(0)
+    with Image.open(buffer) as image:
+        image.load()
+        return save_preview(image, output_path)
+
+
+def save_preview(image: Image.Image, output_path: str, width: int = config.PREVIEW_WIDTH) -> str:
+    """
+    Write a small JPEG thumbnail sized for the GUI image slot
+
+    Args:
+        image: Full-size report image
+        output_path: Destination path
+        width: Thumbnail width in pixels
+
+    Returns:
+        Path to the saved thumbnail
+    """
+    thumbnail = image.convert('RGB')
+    thumbnail.thumbnail((width, width * 10), Image.LANCZOS)
+    thumbnail.save(output_path, format='JPEG', quality=70, optimize=True, progressive=True)
+    return output_path
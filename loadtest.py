@@ -0,0 +1,162 @@
+"""
+Load testing for SMP Portal scraper
+Scrapes a synthetic roster from a local mock portal at several concurrency
+levels and reports throughput and tail latency for each
+"""
+
+import logging
+import math
+import threading
+import time
+from typing import Dict, List, Optional, Sequence
+from mock_portal import FaultPlan, MockPortal, synthetic_roster
+from run_control import CancelToken
+from scraper import SMPScraper
+from sharding import split_shards
+
+logger = logging.getLogger(__name__)
+
+
+def percentile(values: Sequence[float], pct: float) -> float:
+    """Nearest-rank percentile (0 for no values)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+class LoadResult:
+    """Outcome of scraping the roster at one concurrency level"""
+
+    def __init__(self, concurrency: int):
+        self.concurrency = concurrency
+        self.latencies: List[float] = []
+        self.ok = 0
+        self.failed = 0
+        self.login_failures = 0
+        self.retries = 0
+        self.wall = 0.0
+        self.server_counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float, ok: bool):
+        with self._lock:
+            self.latencies.append(seconds)
+            if ok:
+                self.ok += 1
+            else:
+                self.failed += 1
+
+    def add_login_failure(self, schools: int):
+        with self._lock:
+            self.login_failures += 1
+            self.failed += schools
+
+    def add_retries(self, retries: int):
+        with self._lock:
+            self.retries += retries
+
+    @property
+    def throughput(self) -> float:
+        """Schools per second"""
+        return len(self.latencies) / self.wall if self.wall else 0.0
+
+    def row(self) -> str:
+        ms = [percentile(self.latencies, p) * 1000 for p in (50, 95, 99)]
+        worst = max(self.latencies, default=0.0) * 1000
+        return (f"{self.concurrency:>5} {self.ok:>6} {self.failed:>6} {self.retries:>7} {self.wall:>8.2f} "
+                f"{self.throughput:>8.2f} {ms[0]:>8.0f} {ms[1]:>8.0f} {ms[2]:>8.0f} {worst:>8.0f}")
+
+
+def _scrape_shard(schools: List[Dict], base_url: str, result: LoadResult, token: CancelToken,
+                  retry_attempts: Optional[int], retry_delay: Optional[float]):
+    """One client: log in with its own session and scrape its share of the roster"""
+    scraper = SMPScraper(token=token, base_url=base_url)
+    scraper.archive = None
+    scraper.request_delay = 0
+    if retry_attempts is not None:
+        scraper.retry_attempts = max(1, retry_attempts)
+    if retry_delay is not None:
+        scraper.retry_delay = retry_delay
+
+    if not scraper.login():
+        result.add_login_failure(len(schools))
+        return
+
+    for school in schools:
+        if token.stopped:
+            break
+        started = time.perf_counter()
+        data = scraper.get_school_data(school['emis'], school['name'])
+        result.add(time.perf_counter() - started, bool(data['milk'] or data['biscuit']))
+
+    result.add_retries(scraper.retries)
+
+
+def run_load_test(schools_count: int = 200, concurrency: Sequence[int] = (1, 2, 4, 8),
+                  faults: Optional[FaultPlan] = None, retry_attempts: Optional[int] = None,
+                  retry_delay: Optional[float] = None, token: Optional[CancelToken] = None) -> List[LoadResult]:
+    """
+    Scrape a synthetic roster from a local mock portal at each concurrency level
+
+    The load test always runs against its own MockPortal, never the live portal.
+
+    Args:
+        schools_count: Synthetic schools served by the mock portal
+        concurrency: Concurrent clients to try (each with its own session)
+        faults: Faults the mock portal injects
+        retry_attempts: Override config.RETRY_ATTEMPTS for the clients
+        retry_delay: Override config.RETRY_DELAY for the clients
+        token: Cancellation token for the whole test
+
+    Returns:
+        One LoadResult per concurrency level
+    """
+    token = token or CancelToken()
+    roster = synthetic_roster(schools_count)
+    results = []
+
+    with MockPortal(roster, faults) as portal:
+        for level in concurrency:
+            if token.stopped:
+                break
+            logger.info(f"Load test: {len(roster)} schools with {level} concurrent client(s)...")
+            result = LoadResult(level)
+            portal.reset_counts()
+
+            threads = [
+                threading.Thread(target=_scrape_shard, daemon=True,
+                                 args=(shard, portal.url, result, token, retry_attempts, retry_delay))
+                for shard in split_shards(roster, level)
+            ]
+            started = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            result.wall = time.perf_counter() - started
+            result.server_counts = dict(portal.counts)
+            results.append(result)
+    return results
+
+
+def format_report(results: List[LoadResult], faults: Optional[FaultPlan] = None) -> str:
+    """Table of throughput and latency percentiles, one row per concurrency level"""
+    lines = []
+    if faults is not None:
+        lines.append(f"Faults: {faults}")
+    lines.append(f"{'conc':>5} {'ok':>6} {'failed':>6} {'retries':>7} {'wall s':>8} "
+                 f"{'sch/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    lines.extend(result.row() for result in results)
+
+    injected = {}
+    for result in results:
+        for key, count in result.server_counts.items():
+            if key.startswith('fault '):
+                injected.setdefault(key[6:], []).append(f"{count}@{result.concurrency}")
+    if injected:
+        lines.append("")
+        lines.append("Injected faults (count@concurrency): " +
+                     "; ".join(f"{kind} {' '.join(counts)}" for kind, counts in sorted(injected.items())))
+    return "\n".join(lines)
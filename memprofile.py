@@ -0,0 +1,180 @@
+"""
+Memory instrumentation for SMP Portal scraper
+Records tracemalloc usage and RSS for every run phase and school
+"""
+
+import logging
+import os
+import sys
+import threading
+import tracemalloc
+from datetime import datetime
+from typing import Dict, List, Optional
+import config
+import phases
+
+logger = logging.getLogger(__name__)
+
+# Allocation sites listed per phase in the report
+TOP_ALLOCATIONS = 5
+
+
+# Allocations made by the profiler itself are left out of snapshots
+SNAPSHOT_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, __file__),
+    tracemalloc.Filter(False, "<unknown>"),
+]
+
+
+def _snapshot() -> tracemalloc.Snapshot:
+    return tracemalloc.take_snapshot().filter_traces(SNAPSHOT_FILTERS)
+
+
+def current_rss() -> Optional[int]:
+    """Resident set size of this process in bytes (None if unavailable)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def peak_rss() -> Optional[int]:
+    """Peak resident set size of this process in bytes (None if unavailable)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux and Android report kilobytes, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _mb(value: Optional[int]) -> str:
+    return "n/a" if value is None else f"{value / (1024 * 1024):.1f} MB"
+
+
+class MemoryProfiler:
+    """
+    Phase listener that measures Python allocations and RSS
+
+    Only the calling process is measured - worker processes started for
+    sharded runs or parsing are not included.
+    """
+
+    def __init__(self, snapshots: bool = True, frames: int = 1):
+        """
+        Args:
+            snapshots: Take tracemalloc snapshots to list top allocation sites per phase
+            frames: Traceback depth recorded by tracemalloc
+        """
+        self.snapshots = snapshots
+        self.frames = frames
+        self.records: List[Dict] = []
+        self._open: List[Dict] = []
+        self._lock = threading.Lock()
+        self._started_here = False
+
+    def start(self):
+        """Start tracing and listening to phases"""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self._started_here = True
+        phases.add_listener(self)
+
+    def stop(self):
+        """Stop listening (and tracing, if this profiler started it)"""
+        phases.remove_listener(self)
+        if self._started_here:
+            tracemalloc.stop()
+            self._started_here = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        return False
+
+    def phase_started(self, name: str):
+        with self._lock:
+            # Snapshot first, so its own memory is already counted in 'start'
+            snapshot = _snapshot() if self.snapshots else None
+            current, peak = tracemalloc.get_traced_memory()
+            # Carry the peak seen so far up to the enclosing phase before resetting it
+            if self._open:
+                self._open[-1]['peak'] = max(self._open[-1]['peak'], peak)
+            tracemalloc.reset_peak()
+            self._open.append({
+                'name': name,
+                'start': current,
+                'peak': current,
+                'snapshot': snapshot,
+            })
+
+    def phase_finished(self, name: str):
+        with self._lock:
+            if not self._open:
+                return
+            frame = self._open.pop()
+            current, peak = tracemalloc.get_traced_memory()
+            peak = max(frame['peak'], peak)
+
+            top = []
+            if frame['snapshot'] is not None:
+                diff = _snapshot().compare_to(frame['snapshot'], 'lineno')
+                top = [str(stat) for stat in diff[:TOP_ALLOCATIONS]]
+
+            self.records.append({
+                'phase': frame['name'],
+                'depth': len(self._open),
+                'start': frame['start'],
+                'end': current,
+                'peak': peak,
+                'rss': current_rss(),
+                'top': top,
+            })
+
+            if self._open:
+                self._open[-1]['peak'] = max(self._open[-1]['peak'], peak)
+            tracemalloc.reset_peak()
+
+    def report(self) -> str:
+        """Human-readable summary of every recorded phase"""
+        lines = [
+            f"Memory profile - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
+            f"Peak RSS: {_mb(peak_rss())}   Current RSS: {_mb(current_rss())}",
+            "",
+            f"{'phase':<32} {'start':>10} {'end':>10} {'retained':>10} {'peak':>10} {'rss':>10}",
+        ]
+        for record in self.records:
+            name = '  ' * record['depth'] + record['phase']
+            lines.append(
+                f"{name:<32} {_mb(record['start']):>10} {_mb(record['end']):>10} "
+                f"{_mb(record['end'] - record['start']):>10} {_mb(record['peak']):>10} {_mb(record['rss']):>10}"
+            )
+
+        # Top allocation sites of the non-school phases (per-school lists are in the records)
+        for record in self.records:
+            if record['top'] and not record['phase'].startswith('school:'):
+                lines.append("")
+                lines.append(f"Top allocations during '{record['phase']}':")
+                lines.extend(f"  {line}" for line in record['top'])
+        return "\n".join(lines)
+
+    def save_report(self, path: Optional[str] = None) -> str:
+        """
+        Write the report to a file
+
+        Returns:
+            Path to the report (defaults to OUTPUT_DIR/memory_profile_<timestamp>.txt)
+        """
+        if path is None:
+            os.makedirs(config.OUTPUT_DIR, exist_ok=True)
+            stamp = datetime.now().strftime("%Y-%m-%d_%H%M%S")
+            path = os.path.join(config.OUTPUT_DIR, f"memory_profile_{stamp}.txt")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.report() + "\n")
+        return path
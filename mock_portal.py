@@ -0,0 +1,421 @@
+"""
+Local stand-in for the SMP Portal
+Serves /, /login and /detail-report with CSRF tokens, session cookies and
+the two summary cards for a synthetic roster, and injects faults on demand
+so the scraper can be load-tested without touching the live portal
+"""
+
+import argparse
+import gzip
+import json
+import logging
+import random
+import secrets
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs
+import config
+
+logger = logging.getLogger(__name__)
+
+SESSION_COOKIE = 'laravel_session'
+
+# Fault kinds, in the order they are drawn for each request
+FAULT_KINDS = ('drop', '419', '429', '5xx', 'slow')
+
+# Days of history in each synthetic summary table
+HISTORY_DAYS = 10
+
+# Bodies smaller than this are sent uncompressed (like nginx's gzip_min_length)
+GZIP_MIN_LENGTH = 256
+
+
+def synthetic_roster(count: int, first_code: int = 32100001) -> List[Dict]:
+    """
+    Roster of made-up schools
+
+    Args:
+        count: Number of schools
+        first_code: EMIS code of the first school (codes are consecutive)
+
+    Returns:
+        List of {'emis', 'name'} dictionaries, like config.SCHOOLS
+    """
+    return [
+        {"emis": str(first_code + i), "name": f"GPS MOCK SCHOOL {i + 1}"}
+        for i in range(count)
+    ]
+
+
+class FaultPlan:
+    """
+    What the mock portal does wrong, and how often
+
+    Rates are probabilities per detail-report POST. 'drop' closes the
+    connection without a response, '419' expires the session's CSRF token,
+    '429' asks the client to back off, '5xx' returns a server error and
+    'slow' trickles the body out in small chunks.
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, rates: Optional[Dict[str, float]] = None,
+                 retry_after: int = 1, slow_chunk: int = 512, slow_delay: float = 0.05,
+                 seed: Optional[int] = None):
+        """
+        Args:
+            latency: Seconds added to every response
+            jitter: Extra random latency, uniform in 0..jitter seconds
+            rates: Fault kind -> probability (see FAULT_KINDS)
+            retry_after: Retry-After header sent with 429 responses, seconds
+            slow_chunk: Bytes per chunk for slow bodies
+            slow_delay: Seconds between chunks of a slow body
+            seed: Seed for reproducible fault sequences
+        """
+        rates = rates or {}
+        unknown = set(rates) - set(FAULT_KINDS)
+        if unknown:
+            raise ValueError(f"Unknown fault kind(s): {', '.join(sorted(unknown))}")
+        self.latency = latency
+        self.jitter = jitter
+        self.rates = {kind: float(rates.get(kind, 0.0)) for kind in FAULT_KINDS}
+        self.retry_after = retry_after
+        self.slow_chunk = slow_chunk
+        self.slow_delay = slow_delay
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_spec(cls, spec: str, seed: Optional[int] = None) -> 'FaultPlan':
+        """
+        Build a plan from a string such as "latency=0.2,jitter=0.1,429=0.05,drop=0.01"
+
+        latency and jitter are seconds; the fault kinds are probabilities.
+        """
+        latency = jitter = 0.0
+        rates = {}
+        for item in filter(None, (part.strip() for part in (spec or '').split(','))):
+            key, sep, value = item.partition('=')
+            if not sep:
+                raise ValueError(f"Expected name=value in fault spec, got '{item}'")
+            key = key.strip().lower()
+            if key == 'latency':
+                latency = float(value)
+            elif key == 'jitter':
+                jitter = float(value)
+            else:
+                rates[key] = float(value)
+        return cls(latency=latency, jitter=jitter, rates=rates, seed=seed)
+
+    def delay(self) -> float:
+        """Latency for one response"""
+        if not self.jitter:
+            return self.latency
+        with self._lock:
+            return self.latency + self._random.uniform(0, self.jitter)
+
+    def draw(self) -> Optional[str]:
+        """Fault to inject into one request (None = behave)"""
+        with self._lock:
+            roll = self._random.random()
+        for kind in FAULT_KINDS:
+            roll -= self.rates[kind]
+            if roll < 0:
+                return kind
+        return None
+
+    def __str__(self) -> str:
+        parts = [f"latency={self.latency:g}s"]
+        if self.jitter:
+            parts.append(f"jitter={self.jitter:g}s")
+        parts.extend(f"{kind}={rate:g}" for kind, rate in self.rates.items() if rate)
+        return ", ".join(parts)
+
+
+def _summary_rows(emis_code: str, today: datetime, stale_rate: float) -> Dict[str, List[List[str]]]:
+    """Deterministic milk and biscuit history for one school"""
+    rng = random.Random(emis_code)
+    # Some schools have not reported today yet
+    last_day = today - timedelta(days=1 if rng.random() < stale_rate else 0)
+
+    tables = {}
+    for product in ('Milk', 'Biscuit'):
+        stock = rng.randint(400, 2000)
+        rows = []
+        for i in range(HISTORY_DAYS):
+            day = last_day - timedelta(days=HISTORY_DAYS - 1 - i)
+            received = rng.choice((0, 0, 0, rng.randint(200, 800)))
+            present = stock + received
+            consumption = min(present, rng.randint(40, 160))
+            stock = present - consumption
+            rows.append([
+                str(i + 1), day.strftime("%d-%m-%Y"),
+                f"{received:,}", f"{present:,}", f"{consumption:,}", f"{stock:,}",
+            ])
+        tables[product] = rows
+    return tables
+
+
+def _card(title: str, rows: List[List[str]]) -> str:
+    header = ''.join(f"<th>{name}</th>" for name in
+                     ('Sr', 'Date', 'Received Quantity', 'Present Stock', 'Consumption', 'Remaining Balance'))
+    body = ''.join('<tr>' + ''.join(f"<td>{cell}</td>" for cell in row) + '</tr>' for row in rows)
+    return (f'<div class="card"><div class="card-body"><h4 class="header-title">{title}</h4>'
+            f'<table class="table"><thead><tr>{header}</tr></thead><tbody>{body}</tbody></table>'
+            f'</div></div>')
+
+
+def _page(title: str, csrf: str, body: str) -> str:
+    return (f'<!DOCTYPE html><html><head><title>{title}</title>'
+            f'<meta name="csrf-token" content="{csrf}"></head><body>{body}</body></html>')
+
+
+class _PortalHandler(BaseHTTPRequestHandler):
+    """Request handler; portal state lives on self.server.portal"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+    @property
+    def portal(self) -> 'MockPortal':
+        return self.server.portal
+
+    def _session(self) -> Dict:
+        """Session for this request's cookie, creating one if needed"""
+        cookie = SimpleCookie(self.headers.get('Cookie', ''))
+        session_id = cookie[SESSION_COOKIE].value if SESSION_COOKIE in cookie else None
+        session = self.portal.session(session_id)
+        self._new_session = session['id'] != session_id
+        return session
+
+    def _read_body(self) -> bytes:
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def _send(self, status: int, body: str = '', session: Optional[Dict] = None,
+              headers: Optional[Dict[str, str]] = None, slow: bool = False):
+        """Send a complete response after the configured latency"""
+        time.sleep(self.portal.faults.delay())
+        data = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/html; charset=UTF-8')
+        if (self.portal.compress and len(data) >= GZIP_MIN_LENGTH
+                and 'gzip' in self.headers.get('Accept-Encoding', '')):
+            data = gzip.compress(data, compresslevel=6)
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(data)))
+        if session is not None and self._new_session:
+            self.send_header('Set-Cookie', f"{SESSION_COOKIE}={session['id']}; Path=/; HttpOnly")
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+
+        if not slow:
+            self.wfile.write(data)
+            return
+        faults = self.portal.faults
+        for start in range(0, len(data), faults.slow_chunk):
+            self.wfile.write(data[start:start + faults.slow_chunk])
+            self.wfile.flush()
+            time.sleep(faults.slow_delay)
+
+    def _drop(self):
+        """Close the connection without answering"""
+        self.close_connection = True
+        try:
+            self.connection.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def do_GET(self):
+        path = self.path.split('?', 1)[0]
+        session = self._session()
+        self.portal.count(f"GET {path}")
+
+        if path in ('/', '/login'):
+            form = (f'<form method="POST" action="/login">'
+                    f'<input type="hidden" name="_token" value="{session["csrf"]}">'
+                    f'<input name="emis_code"><input name="password" type="password"></form>')
+            self._send(200, _page('Login', session['csrf'], form), session)
+        elif not session['user']:
+            self._send(302, '', session, {'Location': '/login'})
+        elif path == '/dashboard':
+            self._send(200, _page('Dashboard', session['csrf'], f"<h1>Welcome {session['user']}</h1>"), session)
+        elif path == '/detail-report':
+            form = (f'<form id="filters"><input type="hidden" name="_token" value="{session["csrf"]}">'
+                    f'<select name="schoolNameId"></select></form><div id="report"></div>')
+            self._send(200, _page('Detail Report', session['csrf'], form), session)
+        else:
+            self._send(404, _page('Not Found', session['csrf'], '<h1>404</h1>'), session)
+
+    def do_POST(self):
+        path = self.path.split('?', 1)[0]
+        body = self._read_body()
+        session = self._session()
+        self.portal.count(f"POST {path}")
+
+        if path == '/login':
+            form = {key: values[0] for key, values in parse_qs(body.decode('utf-8')).items()}
+            if form.get('_token') != session['csrf']:
+                self._send(419, _page('Page Expired', session['csrf'], '<h1>419</h1>'), session)
+            elif (form.get('emis_code'), form.get('password')) != (self.portal.username, self.portal.password):
+                self._send(302, '', session, {'Location': '/login'})
+            else:
+                session['user'] = form['emis_code']
+                self._send(302, '', session, {'Location': '/dashboard'})
+        elif path == '/detail-report':
+            self._detail_report(body, session)
+        else:
+            self._send(404, _page('Not Found', session['csrf'], '<h1>404</h1>'), session)
+
+    def _detail_report(self, body: bytes, session: Dict):
+        """The AJAX call that returns one school's summary cards"""
+        fault = self.portal.faults.draw()
+        if fault:
+            self.portal.count(f"fault {fault}")
+        if fault == 'drop':
+            self._drop()
+            return
+        if fault == '419':
+            # Expire the token, so the client has to fetch a fresh one
+            self.portal.rotate_csrf(session)
+        if fault == '429':
+            self._send(429, 'Too Many Requests', session, {'Retry-After': str(self.portal.faults.retry_after)})
+            return
+        if fault == '5xx':
+            self._send(random.choice((500, 502, 503)), 'Server Error', session)
+            return
+
+        if not session['user']:
+            self._send(401, 'Unauthenticated', session)
+            return
+        if self.headers.get('X-CSRF-TOKEN') != session['csrf']:
+            self._send(419, 'CSRF token mismatch', session)
+            return
+        try:
+            emis_code = str(json.loads(body or b'{}').get('schoolNameId', ''))
+        except ValueError:
+            self._send(400, 'Bad Request', session)
+            return
+
+        if emis_code in self.portal.codes:
+            tables = _summary_rows(emis_code, datetime.now(), self.portal.stale_rate)
+        else:
+            tables = {'Milk': [], 'Biscuit': []}
+        cards = ''.join(_card(f"Summary Date Wise ({product})", rows) for product, rows in tables.items())
+        # Like the real page, every response carries the session's token and a clock time
+        footer = (f'<input type="hidden" name="_token" value="{session["csrf"]}">'
+                  f'<p class="text-muted">Generated {datetime.now():%d-%m-%Y %I:%M:%S %p}</p>')
+        self._send(200, f'<div class="row">{cards}</div>{footer}', session, slow=(fault == 'slow'))
+
+
+class MockPortal:
+    """
+    Threaded local SMP Portal
+
+    Usage:
+        with MockPortal(synthetic_roster(500), FaultPlan.from_spec("429=0.05")) as portal:
+            scraper = SMPScraper(base_url=portal.url)
+    """
+
+    def __init__(self, schools: Optional[List[Dict]] = None, faults: Optional[FaultPlan] = None,
+                 host: str = '127.0.0.1', port: int = 0, stale_rate: float = 0.1, compress: bool = True):
+        """
+        Args:
+            schools: Schools the portal knows (defaults to config.SCHOOLS)
+            faults: Faults to inject (defaults to none)
+            host: Interface to listen on
+            port: Port to listen on (0 = any free port)
+            stale_rate: Fraction of schools whose latest entry is from yesterday
+            compress: gzip responses for clients that accept it
+        """
+        schools = config.SCHOOLS if schools is None else schools
+        self.codes = {school['emis'] for school in schools}
+        self.faults = faults or FaultPlan()
+        self.stale_rate = stale_rate
+        self.compress = compress
+        self.username = config.USERNAME
+        self.password = config.PASSWORD
+        self.counts: Dict[str, int] = {}
+        self._sessions: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+        self.server = ThreadingHTTPServer((host, port), _PortalHandler)
+        self.server.daemon_threads = True
+        self.server.portal = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        """Base URL to hand to SMPScraper"""
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def session(self, session_id: Optional[str]) -> Dict:
+        """Session for a cookie value (a new session if unknown)"""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = {'id': secrets.token_hex(16), 'csrf': secrets.token_urlsafe(30), 'user': None}
+                self._sessions[session['id']] = session
+            return session
+
+    def rotate_csrf(self, session: Dict):
+        """Replace a session's CSRF token (what an expired page looks like to the client)"""
+        with self._lock:
+            session['csrf'] = secrets.token_urlsafe(30)
+
+    def count(self, key: str):
+        with self._lock:
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    def reset_counts(self):
+        with self._lock:
+            self.counts = {}
+
+    def start(self) -> 'MockPortal':
+        """Serve in a background thread"""
+        self._thread = threading.Thread(target=self.server.serve_forever, name="mock-portal", daemon=True)
+        self._thread.start()
+        logger.info(f"Mock portal serving {len(self.codes)} schools at {self.url} ({self.faults})")
+        return self
+
+    def stop(self):
+        """Stop serving and close the socket"""
+        self.server.shutdown()
+        self.server.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        return False
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Local stand-in for the SMP Portal")
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--schools', type=int, default=None, metavar='N',
+                        help="Serve N synthetic schools (default: the configured roster)")
+    parser.add_argument('--faults', default='', metavar='SPEC',
+                        help="e.g. latency=0.2,jitter=0.1,419=0.02,429=0.05,5xx=0.02,drop=0.01,slow=0.05")
+    parser.add_argument('--seed', type=int, default=None, help="Seed for reproducible faults")
+    args = parser.parse_args()
+
+    roster = synthetic_roster(args.schools) if args.schools else None
+    portal = MockPortal(roster, FaultPlan.from_spec(args.faults, args.seed), port=args.port)
+    portal.start()
+    print(f"Mock portal at {portal.url} - run the scraper with: python cli_main.py --portal-url {portal.url}")
+    try:
+        portal._thread.join()
+    except KeyboardInterrupt:
+        portal.stop()
@@ -0,0 +1,71 @@
+"""
+Run phase markers for SMP Portal scraper
+The scraper and formatter label their work (login, per-school fetch,
+prepare, render); profilers register as listeners to measure each phase
+"""
+
+import threading
+from contextlib import contextmanager
+from typing import List
+
+_listeners: List = []
+_local = threading.local()
+
+# Phase name prefix -> report label ("school:32120163" is a per-school fetch)
+PHASE_LABELS = {'school': 'fetch'}
+
+
+def add_listener(listener):
+    """
+    Register a listener with phase_started(name) and phase_finished(name) methods
+    """
+    if listener not in _listeners:
+        _listeners.append(listener)
+
+
+def remove_listener(listener):
+    """Unregister a listener"""
+    if listener in _listeners:
+        _listeners.remove(listener)
+
+
+def _stack() -> List[str]:
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+def current() -> str:
+    """Innermost phase of the calling thread ('' outside any phase)"""
+    stack = _stack()
+    return stack[-1] if stack else ''
+
+
+def phase_label(name: str) -> str:
+    """Report label for a phase name ('other' outside any phase)"""
+    if not name:
+        return 'other'
+    prefix = name.split(':', 1)[0]
+    return PHASE_LABELS.get(prefix, prefix)
+
+
+@contextmanager
+def phase(name: str):
+    """
+    Mark a block of work as a named phase
+
+    The phase stack is always kept (current() is used for byte accounting);
+    listeners are only called when registered.
+    """
+    stack = _stack()
+    stack.append(name)
+    listeners = list(_listeners)
+    for listener in listeners:
+        listener.phase_started(name)
+    try:
+        yield
+    finally:
+        for listener in listeners:
+            listener.phase_finished(name)
+        stack.pop()
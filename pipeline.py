@@ -0,0 +1,254 @@
+"""
+Pipelined scraping for SMP Portal scraper
+Overlaps network fetching, HTML parsing and rendering in separate stages
+connected by bounded queues, and reports how busy each stage was
+"""
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional, Tuple
+import config
+from phases import phase
+from scraper import SMPScraper, empty_school_result, parse_school_response, response_fingerprint
+
+logger = logging.getLogger(__name__)
+
+# Marks the end of the fetch stage's output
+_DONE = object()
+
+
+def _parse_timed(body: bytes, emis_code: str, school_name: str, fingerprint: str) -> Tuple[Dict, float]:
+    """Parse one response and time it (runs in a parser process)"""
+    started = time.perf_counter()
+    result = parse_school_response(body, emis_code, school_name)
+    result['fingerprint'] = fingerprint
+    return result, time.perf_counter() - started
+
+
+class StageStats:
+    """Busy time and throughput of one pipeline stage"""
+
+    def __init__(self, name: str, workers: int = 1):
+        self.name = name
+        self.workers = workers
+        self.items = 0
+        self.busy = 0.0
+        self.max_queue = 0
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        self.started = time.perf_counter()
+
+    def finish(self):
+        self.finished = time.perf_counter()
+
+    def add(self, seconds: float, items: int = 1):
+        with self._lock:
+            self.busy += seconds
+            self.items += items
+
+    def observe_queue(self, depth: int):
+        self.max_queue = max(self.max_queue, depth)
+
+    @property
+    def wall(self) -> float:
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.perf_counter()) - self.started
+
+    @property
+    def occupancy(self) -> float:
+        """Fraction of the stage's wall time its workers were busy"""
+        capacity = self.wall * self.workers
+        return self.busy / capacity if capacity else 0.0
+
+    def __str__(self) -> str:
+        return (f"{self.name:<7} {self.items:>5} items  busy {self.busy:7.2f}s  "
+                f"wall {self.wall:7.2f}s  x{self.workers}  occupancy {self.occupancy:6.1%}  "
+                f"max queue {self.max_queue}")
+
+
+class ScrapePipeline:
+    """
+    Fetch -> parse -> render pipeline around an SMPScraper
+
+    One fetcher thread pushes raw response bytes into a bounded queue, a pool
+    of parser processes turns them into school records, and rendering starts
+    as soon as all records are in (both products need the full roster).
+    """
+
+    def __init__(self, scraper: SMPScraper, parse_workers: Optional[int] = None,
+                 queue_size: Optional[int] = None):
+        """
+        Args:
+            scraper: Logged-in scraper used by the fetch stage
+            parse_workers: Parser processes (1 = a single parser thread)
+            queue_size: Raw responses buffered between fetch and parse
+        """
+        self.scraper = scraper
+        self.parse_workers = max(1, parse_workers or config.PARSE_WORKERS)
+        self.queue_size = max(1, queue_size or config.PIPELINE_QUEUE_SIZE)
+        self.stats = {
+            'fetch': StageStats('fetch'),
+            'parse': StageStats('parse', self.parse_workers),
+            'render': StageStats('render'),
+        }
+
+    def _fetch_stage(self, schools: List[Dict], raw_queue: queue.Queue):
+        """Fetch raw responses for every school (runs in its own thread)"""
+        stats = self.stats['fetch']
+        token = self.scraper.token
+        stats.start()
+        try:
+            for index, school in enumerate(schools):
+                emis, name = school['emis'], school['name']
+
+                if token.stopped:
+                    result = empty_school_result(emis, name)
+                    result['skipped'] = True
+                    raw_queue.put((index, None, result, None))
+                    continue
+
+                logger.info(f"Fetching data for {emis} - {name}")
+                started = time.perf_counter()
+                body, result, fingerprint = None, None, None
+                try:
+                    with phase(f'school:{emis}'):
+                        body = self.scraper.fetch_school_response(emis)
+                        if body is None:
+                            result = empty_school_result(emis, name)
+                            result['error'] = True
+                        else:
+                            self.scraper.archive_response(emis, body)
+                            # Unchanged responses skip the parse stage altogether
+                            fingerprint = response_fingerprint(body)
+                            result = self.scraper.reuse_unchanged(emis, name, fingerprint)
+                            if result is not None:
+                                body = None
+                except Exception as e:
+                    result = empty_school_result(emis, name)
+                    if token.stopped:
+                        logger.warning(f"Stopped while fetching {emis}: {e}")
+                        result['skipped'] = True
+                    else:
+                        logger.error(f"Request failed for {emis}: {e}")
+                        result['error'] = True
+                stats.add(time.perf_counter() - started)
+
+                # Blocks while the parsers are behind, bounding buffered bodies
+                raw_queue.put((index, body, result, fingerprint))
+                stats.observe_queue(raw_queue.qsize())
+
+                # Small delay to avoid overwhelming the server
+                token.wait(self.scraper.request_delay)
+        finally:
+            stats.finish()
+            raw_queue.put(_DONE)
+
+    def run(self, schools: List[Dict], on_result: Optional[Callable[[Dict], None]] = None) -> List[Dict]:
+        """
+        Run the fetch and parse stages over a list of schools
+
+        Args:
+            schools: Schools to scrape
+            on_result: Called with each record as soon as it is parsed
+                (not for schools skipped by a deadline or cancel, nor for
+                failed fetches, marked 'error': True)
+
+        Returns:
+            School data dictionaries in the order of schools
+        """
+        results: List[Optional[Dict]] = [None] * len(schools)
+        raw_queue: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        parse_stats = self.stats['parse']
+        max_in_flight = self.parse_workers * 2
+
+        def finish(index: int, result: Dict):
+            results[index] = result
+            if result.get('fingerprint') and not result.get('error'):
+                # Later runs of the same scraper can reuse the parsed record
+                self.scraper.known[result['emis']] = result
+            if on_result and not result.get('skipped') and not result.get('error'):
+                on_result(result)
+
+        fetcher = threading.Thread(target=self._fetch_stage, args=(schools, raw_queue), daemon=True)
+        executor_class = ProcessPoolExecutor if self.parse_workers > 1 else ThreadPoolExecutor
+
+        logger.info(f"Pipelined scrape of {len(schools)} schools "
+                    f"({self.parse_workers} parser(s), queue {self.queue_size})...")
+        fetcher.start()
+        parse_stats.start()
+
+        with executor_class(max_workers=self.parse_workers) as pool:
+            pending = {}
+
+            def drain(block: bool):
+                done, _ = wait(pending, timeout=None if block else 0, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index = pending.pop(future)
+                    school = schools[index]
+                    try:
+                        result, seconds = future.result()
+                        parse_stats.add(seconds)
+                    except Exception as e:
+                        logger.error(f"Unexpected error for {school['emis']}: {e}")
+                        result = empty_school_result(school['emis'], school['name'])
+                        result['error'] = True
+                    finish(index, result)
+
+            while True:
+                item = raw_queue.get()
+                if item is _DONE:
+                    break
+                index, body, result, fingerprint = item
+                if result is not None:
+                    finish(index, result)
+                    continue
+
+                school = schools[index]
+                pending[pool.submit(_parse_timed, body, school['emis'], school['name'], fingerprint)] = index
+                parse_stats.observe_queue(len(pending))
+                del body
+                if len(pending) >= max_in_flight:
+                    drain(block=True)
+                elif pending:
+                    drain(block=False)
+
+            while pending:
+                drain(block=True)
+
+        parse_stats.finish()
+        fetcher.join()
+
+        skipped = sum(1 for result in results if result.get('skipped'))
+        if skipped:
+            logger.warning(f"Run stopped - {skipped} schools not fetched")
+        return results
+
+    def render(self, formatter, schools_data: List[Dict], **kwargs) -> Dict[str, str]:
+        """
+        Run the render stage (DataFormatter.generate_images) and time it
+
+        Args:
+            formatter: DataFormatter to render with
+            schools_data: Records returned by run()
+            **kwargs: Passed on to generate_images()
+        """
+        stats = self.stats['render']
+        stats.start()
+        try:
+            output_files = formatter.generate_images(schools_data, **kwargs)
+        finally:
+            stats.add(stats.wall)
+            stats.finish()
+        return output_files
+
+    def report(self) -> str:
+        """Stage occupancy summary, one line per stage that ran"""
+        lines = [str(stats) for stats in self.stats.values() if stats.started is not None]
+        return "\n".join(lines)
@@ -0,0 +1,169 @@
+"""
+CPU profiling for SMP Portal scraper
+Profiles a whole run with cProfile (one pstats file per phase) and a
+sampling profiler that writes collapsed stacks for flamegraph tools
+"""
+
+import cProfile
+import io
+import logging
+import os
+import pstats
+import sys
+import threading
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional
+import config
+import phases
+from phases import phase_label
+
+logger = logging.getLogger(__name__)
+
+# Seconds between stack samples
+SAMPLE_INTERVAL = 0.005
+
+
+class RunProfiler:
+    """
+    Phase listener that profiles the thread running the scrape
+
+    Produces <label>.pstats for each phase label (login, fetch, prepare,
+    render, other), run.pstats for the whole run, and stacks.collapsed with
+    sampled stacks rooted at their phase ("render;module:function;...").
+    Worker processes (sharded runs, parser pools) are not profiled.
+    """
+
+    def __init__(self, output_dir: Optional[str] = None, interval: float = SAMPLE_INTERVAL):
+        """
+        Args:
+            output_dir: Where to write the profile files
+                (defaults to OUTPUT_DIR/profiles/<timestamp>)
+            interval: Seconds between stack samples
+        """
+        stamp = datetime.now().strftime("%Y-%m-%d_%H%M%S")
+        self.output_dir = output_dir or os.path.join(config.OUTPUT_DIR, "profiles", stamp)
+        self.interval = interval
+        self.profiles: Dict[str, cProfile.Profile] = {}
+        self.samples: Counter = Counter()
+        self._labels: List[str] = ['other']
+        self._thread_id: Optional[int] = None
+        self._stop = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+
+    def _switch(self, label: str):
+        """Stop the active phase profile and start the one for label"""
+        current = self.profiles.get(self._labels[-1])
+        if current:
+            current.disable()
+        profile = self.profiles.setdefault(label, cProfile.Profile())
+        profile.enable()
+
+    def start(self):
+        """Start profiling the calling thread"""
+        self._thread_id = threading.get_ident()
+        phases.add_listener(self)
+        self._switch('other')
+        self._stop.clear()
+        self._sampler = threading.Thread(target=self._sample_loop, name="stack-sampler", daemon=True)
+        self._sampler.start()
+
+    def stop(self):
+        """Stop profiling"""
+        self._stop.set()
+        if self._sampler:
+            self._sampler.join()
+        phases.remove_listener(self)
+        self.profiles[self._labels[-1]].disable()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        return False
+
+    def phase_started(self, name: str):
+        if threading.get_ident() != self._thread_id:
+            return
+        label = phase_label(name)
+        self._switch(label)
+        self._labels.append(label)
+
+    def phase_finished(self, name: str):
+        if threading.get_ident() != self._thread_id or len(self._labels) == 1:
+            return
+        self.profiles[self._labels.pop()].disable()
+        self.profiles[self._labels[-1]].enable()
+
+    def _sample_loop(self):
+        """Record the profiled thread's stack every interval"""
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                module = os.path.splitext(os.path.basename(code.co_filename))[0]
+                if module == '__init__':
+                    module = os.path.basename(os.path.dirname(code.co_filename))
+                stack.append(f"{module}:{code.co_name}")
+                frame = frame.f_back
+            stack.append(self._labels[-1])
+            self.samples[";".join(reversed(stack))] += 1
+
+    def save(self) -> Dict[str, str]:
+        """
+        Write pstats and collapsed-stack files
+
+        Returns:
+            Dictionary of file label -> path
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        paths = {}
+
+        combined = None
+        for label, profile in self.profiles.items():
+            try:
+                stats = pstats.Stats(profile)
+            except TypeError:
+                # Phase never ran any profiled code
+                continue
+            path = os.path.join(self.output_dir, f"{label}.pstats")
+            stats.dump_stats(path)
+            paths[label] = path
+            if combined is None:
+                combined = pstats.Stats(profile)
+            else:
+                combined.add(profile)
+
+        if combined is not None:
+            paths['run'] = os.path.join(self.output_dir, "run.pstats")
+            combined.dump_stats(paths['run'])
+
+        paths['stacks'] = os.path.join(self.output_dir, "stacks.collapsed")
+        with open(paths['stacks'], 'w', encoding='utf-8') as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+
+        return paths
+
+    def summary(self, limit: int = 15) -> str:
+        """Samples per phase and the top functions by cumulative time"""
+        per_label = Counter()
+        for stack, count in self.samples.items():
+            per_label[stack.split(';', 1)[0]] += count
+        total = sum(per_label.values()) or 1
+
+        lines = ["Samples by phase:"]
+        lines.extend(f"  {label:<10} {count:>7}  {count / total:6.1%}" for label, count in per_label.most_common())
+
+        run_pstats = os.path.join(self.output_dir, "run.pstats")
+        if os.path.exists(run_pstats):
+            buffer = io.StringIO()
+            pstats.Stats(run_pstats, stream=buffer).sort_stats('cumulative').print_stats(limit)
+            lines.append("")
+            lines.append(buffer.getvalue().strip())
+        return "\n".join(lines)
@@ -0,0 +1,134 @@
+"""
+Offline re-parse of archived detail-report responses
+Rebuilds school data for a past day without any network access
+"""
+
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+import config
+from archive import ResponseArchive
+from scraper import parse_school_history, parse_school_response
+
+logger = logging.getLogger(__name__)
+
+
+def _reparse_one(root: str, day: str, emis_code: str, school_name: str) -> Dict:
+    """Load and parse one archived response (runs in a worker process)"""
+    body = ResponseArchive(root, day).load(emis_code)
+    return parse_school_response(body, emis_code, school_name)
+
+
+def _history_one(root: str, day: str, emis_code: str, school_name: str) -> Dict:
+    """Load one archived response and extract its full history (runs in a worker process)"""
+    body = ResponseArchive(root, day).load(emis_code)
+    return parse_school_history(body, emis_code, school_name)
+
+
+def _roster_order(codes) -> List[str]:
+    """EMIS codes in config.SCHOOLS order, followed by any no longer in the roster"""
+    codes = set(codes)
+    ordered = [school['emis'] for school in config.SCHOOLS if school['emis'] in codes]
+    return ordered + sorted(codes - set(ordered))
+
+
+def _run_jobs(parse, jobs: List[tuple], workers: int) -> List[Dict]:
+    """Run parse over (root, day, emis, name) jobs, in job order"""
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+            return list(pool.map(parse, *zip(*jobs), chunksize=8))
+    return [parse(*job) for job in jobs]
+
+
+def _parse_archive(parse, day: str, workers: Optional[int], root: Optional[str]) -> List[Dict]:
+    """Run parse over every archived response of a day, in roster order"""
+    archive = ResponseArchive(root, day)
+    archived = archive.codes()
+    if not archived:
+        logger.error(f"No archived responses found for {day} in {archive.root}")
+        return []
+
+    names = {school['emis']: school['name'] for school in config.SCHOOLS}
+    ordered = _roster_order(archived)
+
+    workers = workers or os.cpu_count() or 1
+    logger.info(f"Re-parsing {len(ordered)} archived responses for {day} with {workers} worker(s)...")
+
+    jobs = [(archive.root, day, emis, names.get(emis, '')) for emis in ordered]
+    return _run_jobs(parse, jobs, workers)
+
+
+def latest_responses(root: Optional[str] = None) -> Dict[str, str]:
+    """
+    Newest archived day of every school in the archive
+
+    A --schools or --only-stale run archives only a subset, so the latest
+    day alone may not hold the whole roster.
+
+    Returns:
+        EMIS code -> archive day (YYYY-MM-DD)
+    """
+    latest = {}
+    for day in reversed(ResponseArchive.available_days(root)):
+        for emis in ResponseArchive(root, day).codes():
+            latest.setdefault(emis, day)
+    return latest
+
+
+def reparse_day(day: str, workers: Optional[int] = None, root: Optional[str] = None) -> List[Dict]:
+    """
+    Re-run extraction over every archived response of a day
+
+    Schools are returned in config.SCHOOLS order, followed by any archived
+    schools that are no longer in the roster.
+
+    Args:
+        day: Archive day as YYYY-MM-DD
+        workers: Worker processes (defaults to the CPU count; 1 = in-process)
+        root: Archive directory (defaults to config.ARCHIVE_DIR)
+
+    Returns:
+        List of school data dictionaries, as produced by SMPScraper
+    """
+    return _parse_archive(_reparse_one, day, workers, root)
+
+
+def history_day(day: Optional[str] = None, workers: Optional[int] = None, root: Optional[str] = None) -> List[Dict]:
+    """
+    Full milk and biscuit history of every archived school
+
+    Each response holds the school's whole date-wise summary, so one archived
+    response per school is enough to rebuild the complete history. Without a
+    day, each school's newest response across all archived days is used.
+
+    Args:
+        day: Archive day as YYYY-MM-DD (defaults to each school's latest)
+        workers: Worker processes (defaults to the CPU count; 1 = in-process)
+        root: Archive directory (defaults to config.ARCHIVE_DIR)
+
+    Returns:
+        List of history dictionaries (see scraper.parse_school_history)
+    """
+    if day is not None:
+        histories = _parse_archive(_history_one, day, workers, root)
+    else:
+        latest = latest_responses(root)
+        if not latest:
+            logger.error("The response archive is empty - no history available")
+            return []
+        archive_root = root or config.ARCHIVE_DIR
+        names = {school['emis']: school['name'] for school in config.SCHOOLS}
+        jobs = [(archive_root, latest[emis], emis, names.get(emis, '')) for emis in _roster_order(latest)]
+        days = sorted(set(latest.values()))
+        workers = workers or os.cpu_count() or 1
+        logger.info(f"Re-parsing the latest archived response of {len(jobs)} schools "
+                    f"({days[0]} to {days[-1]}) with {workers} worker(s)...")
+        histories = _run_jobs(_history_one, jobs, workers)
+
+    found = {history['emis'] for history in histories}
+    missing = sum(1 for school in config.SCHOOLS if school['emis'] not in found)
+    if histories and missing:
+        logger.warning(f"{missing} of {len(config.SCHOOLS)} roster schools have no archived response "
+                       f"and are left out of the history")
+    return histories
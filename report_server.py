@@ -0,0 +1,386 @@
+"""
+Local caching report server for SMP Portal scraper
+Scrapes the portal once per TTL and serves the latest school records (JSON)
+and rendered report images to any number of clients on the office network
+"""
+
+import json
+import logging
+import mimetypes
+import os
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlsplit
+import requests
+import config
+from data_formatter import DataFormatter
+from delta import record_changes
+from result_store import ResultStore
+from roster import Roster
+from run_control import CancelToken
+from scraper import SMPScraper, empty_school_result
+
+logger = logging.getLogger(__name__)
+
+
+class ScrapeFailed(Exception):
+    """Raised when a refresh fails and there is no earlier snapshot to serve"""
+
+
+class Snapshot:
+    """One scrape of the roster, plus the reports rendered from it (on first request)"""
+
+    def __init__(self, schools: List[Dict], changes: Optional[List[Dict]] = None):
+        self.schools = schools
+        self.changes = changes or []  # schools that changed since the previous scrape (delta.diff_records)
+        self.fetched_at = datetime.now()
+        self.created = time.monotonic()
+        self.images: Optional[Dict[str, str]] = None
+        self.previews: Dict[str, str] = {}
+        self.stale = False  # True when served after a failed refresh
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.created
+
+
+class ReportCache:
+    """
+    Latest records and rendered reports, refreshed at most once per TTL
+
+    Concurrent callers that find the cache expired share a single in-flight
+    scrape (single-flight), so portal load does not grow with the number of
+    clients. A failed refresh keeps serving the previous snapshot, marked
+    stale, and the next attempt waits config.REFRESH_RETRY_DELAY seconds,
+    doubling after each further failure (up to the TTL), so an outage does
+    not turn every client request into a fresh login and scrape. A refresh
+    where more than config.REFRESH_MAX_ERRORS of the schools failed counts
+    as failed; below that, failed schools keep their last good record and
+    the snapshot is served stale until the retry.
+    """
+
+    def __init__(self, ttl: float = config.REPORT_TTL, base_url: Optional[str] = None,
+                 schools: Optional[List[Dict]] = None):
+        """
+        Args:
+            ttl: Seconds a snapshot is served before the portal is scraped again
+            base_url: Portal to scrape instead of config.PORTAL_URL
+            schools: Roster to scrape (defaults to config.SCHOOLS)
+        """
+        self.ttl = ttl
+        self.base_url = base_url
+        self.schools = list(config.SCHOOLS if schools is None else schools)
+        self.scrapes = 0
+        self.hits = 0
+        self._snapshot: Optional[Snapshot] = None
+        self._failures = 0  # refreshes failed in a row
+        self._retry_at = 0.0  # time.monotonic() before which a failed refresh is not retried
+        self._inflight: Optional[Future] = None
+        self._lock = threading.Lock()
+        self._render_lock = threading.Lock()
+
+    @property
+    def snapshot(self) -> Optional[Snapshot]:
+        """Latest snapshot without refreshing (None before the first scrape)"""
+        return self._snapshot
+
+    @property
+    def refreshing(self) -> bool:
+        return self._inflight is not None
+
+    def _fresh(self) -> bool:
+        return self._snapshot is not None and not self._snapshot.stale and self._snapshot.age < self.ttl
+    
+    def _backing_off(self) -> bool:
+        """True while the last refresh failed and its retry delay has not passed"""
+        return self._failures > 0 and time.monotonic() < self._retry_at
+    
+    @property
+    def retry_in(self) -> Optional[float]:
+        """Seconds until a failed refresh may be retried (None when not backing off)"""
+        return max(0.0, self._retry_at - time.monotonic()) if self._backing_off() else None
+
+    def _schedule_retry(self) -> float:
+        """Count a failed refresh and set when the next one may run (call with the lock held)"""
+        self._failures += 1
+        delay = min(config.REFRESH_RETRY_DELAY * 2 ** (self._failures - 1),
+                    max(self.ttl, config.REFRESH_RETRY_DELAY))
+        self._retry_at = time.monotonic() + delay
+        return delay
+
+    def _keep_last_good(self, schools: List[Dict], previous: Dict[str, Dict]) -> int:
+        """
+        Replace failed schools' records with their last good one
+
+        Taken from the ResultStore (previous) or, failing that, the current
+        snapshot. Schools with neither keep their error record.
+
+        Returns:
+            Number of failed schools
+        """
+        last = {school['emis']: school for school in self._snapshot.schools} if self._snapshot else {}
+        failed = 0
+        for index, school in enumerate(schools):
+            if not school.get('error'):
+                continue
+            failed += 1
+            good = previous.get(school['emis']) or last.get(school['emis'])
+            if good and not good.get('error'):
+                schools[index] = good
+        return failed
+
+    def get(self, force: bool = False) -> Snapshot:
+        """
+        Current snapshot, scraping the portal if it has expired
+
+        Args:
+            force: Refresh even if the snapshot is still within its TTL
+                (joins a refresh that is already running; ignored while the
+                snapshot is younger than config.FORCE_REFRESH_MIN_AGE; does
+                not skip the wait after a failed refresh)
+
+        Raises:
+            ScrapeFailed if the portal could not be scraped and nothing is cached
+        """
+        with self._lock:
+            if self._backing_off():
+                if self._snapshot is None:
+                    raise ScrapeFailed(f"Portal unavailable, next attempt in {self.retry_in:.0f}s")
+                self.hits += 1
+                return self._snapshot
+            if force and self._snapshot is not None and self._snapshot.age < config.FORCE_REFRESH_MIN_AGE:
+                # Any client on the network can ask; at most one forced scrape per minimum age
+                force = False
+            if not force and self._fresh():
+                self.hits += 1
+                return self._snapshot
+            future = self._inflight
+            leader = future is None
+            if leader:
+                future = self._inflight = Future()
+
+        if leader:
+            try:
+                future.set_result(self._refresh())
+            except Exception as e:
+                future.set_exception(e)
+            finally:
+                with self._lock:
+                    self._inflight = None
+        return future.result()
+
+    def _refresh(self) -> Snapshot:
+        """Scrape the roster (runs in the leader's thread only)"""
+        self.scrapes += 1
+        logger.info(f"Refreshing report cache ({len(self.schools)} schools)...")
+        try:
+            scraper = SMPScraper(token=CancelToken(), base_url=self.base_url)
+            if not scraper.login():
+                raise ScrapeFailed("Login to the portal failed")
+            store = ResultStore()
+            previous = store.load(school['emis'] for school in self.schools)
+            # Schools whose page has not changed since the last refresh skip parsing
+            scraper.remember(previous.values())
+            try:
+                schools = scraper.scrape_all_schools(on_result=store.save, schools=self.schools)
+            finally:
+                store.close()
+            logger.info(scraper.transfer.summary())
+            failed = sum(1 for school in schools if school.get('error'))
+            if failed > config.REFRESH_MAX_ERRORS * len(schools):
+                raise ScrapeFailed(f"{failed} of {len(schools)} schools could not be fetched")
+            changes = record_changes(previous, schools)
+        except Exception as e:
+            with self._lock:
+                delay = self._schedule_retry()
+                last = self._snapshot
+            if last is None:
+                raise ScrapeFailed(str(e)) from e
+            logger.error(f"Refresh failed, serving the previous snapshot (next attempt in {delay:g}s): {e}")
+            last.stale = True
+            return last
+
+        with self._lock:
+            failed = self._keep_last_good(schools, previous)
+            snapshot = Snapshot(schools, changes)
+            if failed:
+                # Some schools show their last good record: retry them after the usual delay
+                snapshot.stale = True
+                delay = self._schedule_retry()
+                logger.warning(f"{failed} schools could not be fetched and keep their last good record "
+                               f"(next attempt in {delay:g}s)")
+            else:
+                self._failures = 0
+            self._snapshot = snapshot
+        return snapshot
+
+    def images(self, snapshot: Snapshot) -> Snapshot:
+        """Render the snapshot's reports once, on first request"""
+        with self._render_lock:
+            if snapshot.images is None:
+                formatter = DataFormatter()
+                snapshot.images = formatter.generate_images(snapshot.schools)
+                snapshot.previews = dict(formatter.previews)
+        return snapshot
+
+
+class _ReportHandler(BaseHTTPRequestHandler):
+    """Routes: /api/schools, /api/schools/<emis>, /api/changes, /api/status, /reports/<product>"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+    @property
+    def cache(self) -> ReportCache:
+        return self.server.cache
+
+    def _send(self, status: int, data: bytes, content_type: str, snapshot: Optional[Snapshot] = None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        if snapshot is not None:
+            max_age = 0 if snapshot.stale else max(0, int(self.cache.ttl - snapshot.age))
+            self.send_header('Cache-Control', f"max-age={max_age}")
+            # HTTP-date: GMT (fetched_at is naive local time)
+            fetched_utc = snapshot.fetched_at.astimezone(timezone.utc)
+            self.send_header('Last-Modified', format_datetime(fetched_utc, usegmt=True))
+            self.send_header('X-Cache', 'STALE' if snapshot.stale else 'OK')
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _json(self, status: int, payload, snapshot: Optional[Snapshot] = None):
+        self._send(status, json.dumps(payload).encode('utf-8'), 'application/json', snapshot)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        force = query.get('refresh', ['0'])[0] in ('1', 'true')
+        parts = [part for part in url.path.split('/') if part]
+
+        if parts == ['api', 'status']:
+            snapshot = self.cache.snapshot
+            self._json(200, {
+                'ttl': self.cache.ttl,
+                'schools': len(self.cache.schools),
+                'scrapes': self.cache.scrapes,
+                'cache_hits': self.cache.hits,
+                'refreshing': self.cache.refreshing,
+                'retry_in': round(self.cache.retry_in, 1) if self.cache.retry_in is not None else None,
+                'fetched_at': snapshot.fetched_at.isoformat(timespec='seconds') if snapshot else None,
+                'age': round(snapshot.age, 1) if snapshot else None,
+                'stale': snapshot.stale if snapshot else None,
+            })
+            return
+        if not parts or parts[0] not in ('api', 'reports'):
+            self._json(404, {'error': 'not found'})
+            return
+
+        try:
+            snapshot = self.cache.get(force=force)
+        except ScrapeFailed as e:
+            self._json(502, {'error': str(e)})
+            return
+
+        if parts == ['api', 'schools']:
+            self._json(200, {
+                'fetched_at': snapshot.fetched_at.isoformat(timespec='seconds'),
+                'stale': snapshot.stale,
+                'schools': snapshot.schools,
+            }, snapshot)
+        elif parts == ['api', 'changes']:
+            # Only the schools that changed in the latest scrape
+            self._json(200, {
+                'fetched_at': snapshot.fetched_at.isoformat(timespec='seconds'),
+                'stale': snapshot.stale,
+                'changes': snapshot.changes,
+            }, snapshot)
+        elif len(parts) == 3 and parts[:2] == ['api', 'schools']:
+            school = next((s for s in snapshot.schools if s['emis'] == parts[2]), None)
+            if school:
+                self._json(200, school, snapshot)
+            else:
+                self._json(404, {'error': f"unknown school {parts[2]}"})
+        elif len(parts) == 2 and parts[0] == 'reports':
+            self._report_image(snapshot, parts[1], preview=query.get('preview', ['0'])[0] in ('1', 'true'))
+        else:
+            self._json(404, {'error': 'not found'})
+
+    def _report_image(self, snapshot: Snapshot, name: str, preview: bool):
+        """Rendered report image for a product ('milk' or 'biscuit', extension optional)"""
+        product = os.path.splitext(name)[0]
+        self.cache.images(snapshot)
+        path = (snapshot.previews if preview else snapshot.images).get(product)
+        if not path or not os.path.exists(path):
+            self._json(404, {'error': f"no {product} report (no data for today?)"})
+            return
+        with open(path, 'rb') as f:
+            data = f.read()
+        self._send(200, data, mimetypes.guess_type(path)[0] or 'application/octet-stream', snapshot)
+
+
+class ReportServer:
+    """HTTP front end for a ReportCache"""
+
+    def __init__(self, cache: ReportCache, host: str = config.SERVER_HOST, port: int = config.SERVER_PORT):
+        self.cache = cache
+        self.server = ThreadingHTTPServer((host, port), _ReportHandler)
+        self.server.daemon_threads = True
+        self.server.cache = cache
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def serve_forever(self):
+        logger.info(f"Report server listening on {self.url} (TTL {self.cache.ttl:g}s)")
+        try:
+            self.server.serve_forever()
+        finally:
+            self.server.server_close()
+
+    def shutdown(self):
+        self.server.shutdown()
+
+
+def fetch_server_records(server_url: str, schools: List[Dict], refresh: bool = False) -> List[Dict]:
+    """
+    School records for a roster from a running report server (no portal access)
+
+    Args:
+        server_url: Base URL of the report server
+        schools: Schools wanted
+        refresh: Ask the server to refresh its cache first
+
+    Returns:
+        Records in the order of schools; schools the server has no record
+        for are marked 'skipped': True
+
+    Raises:
+        requests.RequestException if the server cannot be reached
+    """
+    response = requests.get(
+        f"{server_url.rstrip('/')}/api/schools",
+        params={'refresh': '1'} if refresh else None,
+        # Connecting is quick; the reply may wait for a full roster scrape
+        timeout=(config.REQUEST_TIMEOUT, config.SERVER_READ_TIMEOUT)
+    )
+    response.raise_for_status()
+    payload = response.json()
+    by_emis = Roster(payload['schools'])
+
+    records = []
+    for school in schools:
+        record = by_emis.get(school['emis'])
+        if record is None:
+            record = empty_school_result(school['emis'], school['name'])
+            record['skipped'] = True
+        records.append(record)
+    return records
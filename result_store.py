@@ -0,0 +1,177 @@
+"""
+Local result store for SMP Portal scraper
+Keeps the last scraped record of every school in SQLite
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+import config
+from rollups import RollupIndex
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    emis TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    milk TEXT,
+    biscuit TEXT,
+    fetched_at TEXT NOT NULL,
+    fingerprint TEXT
+)
+"""
+
+_COLUMNS = "emis, name, milk, biscuit, fetched_at, fingerprint"
+
+
+class ResultStore:
+    """
+    Last known result per school, keyed by EMIS code
+
+    Markaz / tehsil / district totals are kept up to date on every save()
+    (see rollups.RollupIndex) and read with rollup_summary().
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        Args:
+            path: SQLite database file (defaults to config.RESULT_DB)
+        """
+        self.path = path or config.RESULT_DB
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        # WAL lets readers and several writer processes share the file
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(SCHEMA)
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(results)")]
+        if 'fingerprint' not in columns:
+            # Stores created before response fingerprints
+            self._conn.execute("ALTER TABLE results ADD COLUMN fingerprint TEXT")
+        self._conn.commit()
+
+        self.rollups = RollupIndex(self._conn)
+        if self.rollups.is_empty():
+            self._backfill_rollups()
+
+    def _backfill_rollups(self):
+        """Build rollups for results stored before rollups existed"""
+        stored = list(self.load().values())
+        if not stored:
+            return
+        logger.info(f"Building area rollups for {len(stored)} stored schools...")
+        with self._lock:
+            for result in stored:
+                self.rollups.update(result)
+            self._conn.commit()
+
+    def save(self, result: Dict, fetched_at: Optional[datetime] = None):
+        """
+        Store (replace) the latest result for a school
+
+        Args:
+            result: School data dictionary from SMPScraper (its 'fingerprint',
+                if any, is stored so unchanged responses need not be parsed again)
+            fetched_at: When it was fetched (defaults to now)
+        """
+        fetched_at = (fetched_at or datetime.now()).isoformat(timespec='seconds')
+        row = (
+            result['emis'],
+            result['name'],
+            json.dumps(result['milk']) if result.get('milk') else None,
+            json.dumps(result['biscuit']) if result.get('biscuit') else None,
+            fetched_at,
+            result.get('fingerprint'),
+        )
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO results ({_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?)",
+                row
+            )
+            # Same transaction, so the rollups never disagree with the results
+            self.rollups.update(result)
+            self._conn.commit()
+
+    @staticmethod
+    def _to_result(row) -> Dict:
+        emis, name, milk, biscuit, fetched_at, fingerprint = row
+        return {
+            'emis': emis,
+            'name': name,
+            'milk': json.loads(milk) if milk else None,
+            'biscuit': json.loads(biscuit) if biscuit else None,
+            'fetched_at': fetched_at,
+            'fingerprint': fingerprint,
+        }
+
+    def get(self, emis_code: str) -> Optional[Dict]:
+        """Last stored result for a school, or None"""
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {_COLUMNS} FROM results WHERE emis = ?", (emis_code,)
+            ).fetchone()
+        return self._to_result(row) if row else None
+
+    def load(self, codes: Optional[Iterable[str]] = None) -> Dict[str, Dict]:
+        """
+        Stored results keyed by EMIS code
+
+        Args:
+            codes: Only these schools (default: all)
+        """
+        with self._lock:
+            rows = self._conn.execute(f"SELECT {_COLUMNS} FROM results").fetchall()
+        results = {row[0]: self._to_result(row) for row in rows}
+        if codes is not None:
+            wanted = set(codes)
+            results = {emis: result for emis, result in results.items() if emis in wanted}
+        return results
+
+    def needs_refresh(self, schools: List[Dict], today: Optional[str] = None) -> List[Dict]:
+        """
+        Schools whose last result is missing or stale
+
+        A result is missing if the school was never stored or had no milk or
+        biscuit entry, and stale if it was fetched before today or either
+        product's latest entry is not dated today.
+
+        Args:
+            schools: Candidate schools
+            today: Today's date as dd-mm-yyyy (defaults to the current date)
+
+        Returns:
+            The subset of schools to re-scrape, in the given order
+        """
+        now = datetime.now()
+        today = today or now.strftime("%d-%m-%Y")
+        today_iso = now.strftime("%Y-%m-%d")
+        stored = self.load(school['emis'] for school in schools)
+
+        refresh = []
+        for school in schools:
+            result = stored.get(school['emis'])
+            if result is None or not (result['milk'] or result['biscuit']):
+                refresh.append(school)
+            elif not result['fetched_at'].startswith(today_iso):
+                refresh.append(school)
+            elif any(not result[p] or result[p]['date'] != today for p in ('milk', 'biscuit')):
+                refresh.append(school)
+        return refresh
+
+    def rollup_summary(self, level: str, day: Optional[str] = None, product: Optional[str] = None) -> List[Dict]:
+        """Area totals for a level and day (see rollups.RollupIndex.summary)"""
+        with self._lock:
+            return self.rollups.summary(level, day, product)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,177 @@
+"""
+Markaz / tehsil / district rollups for SMP Portal scraper
+Keeps per-area, per-product, per-day totals up to date as each school
+record is stored, so area reports never re-aggregate the roster
+"""
+
+import logging
+import sqlite3
+from datetime import datetime
+from typing import Dict, List, Optional
+import config
+from exporter import NUMERIC_FIELDS, PRODUCTS, to_number
+from roster import Roster
+
+logger = logging.getLogger(__name__)
+
+# Area levels, smallest first
+LEVELS = ('markaz', 'tehsil', 'district')
+
+# Summed quantity columns (same order as exporter.NUMERIC_FIELDS)
+QUANTITIES = ('received', 'present', 'consumption', 'remaining')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rollup_entries (
+    emis TEXT NOT NULL,
+    product TEXT NOT NULL,
+    day TEXT NOT NULL,
+    markaz TEXT NOT NULL,
+    tehsil TEXT NOT NULL,
+    district TEXT NOT NULL,
+    received REAL NOT NULL,
+    present REAL NOT NULL,
+    consumption REAL NOT NULL,
+    remaining REAL NOT NULL,
+    PRIMARY KEY (emis, product, day)
+);
+CREATE TABLE IF NOT EXISTS rollups (
+    level TEXT NOT NULL,
+    area TEXT NOT NULL,
+    product TEXT NOT NULL,
+    day TEXT NOT NULL,
+    schools INTEGER NOT NULL,
+    received REAL NOT NULL,
+    present REAL NOT NULL,
+    consumption REAL NOT NULL,
+    remaining REAL NOT NULL,
+    PRIMARY KEY (level, area, product, day)
+);
+"""
+
+_UPSERT = """
+INSERT INTO rollups (level, area, product, day, schools, received, present, consumption, remaining)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (level, area, product, day) DO UPDATE SET
+    schools = schools + excluded.schools,
+    received = received + excluded.received,
+    present = present + excluded.present,
+    consumption = consumption + excluded.consumption,
+    remaining = remaining + excluded.remaining
+"""
+
+
+def school_areas(school: Optional[Dict]) -> Dict[str, str]:
+    """
+    Markaz, tehsil and district of a school
+
+    Roster entries may carry "markaz", "tehsil" and "district" keys; anything
+    missing falls back to the configured MARKAZ_NAME / TEHSIL_NAME / DISTRICT_NAME.
+    """
+    school = school or {}
+    return {
+        'markaz': school.get('markaz') or config.MARKAZ_NAME,
+        'tehsil': school.get('tehsil') or config.TEHSIL_NAME,
+        'district': school.get('district') or config.DISTRICT_NAME,
+    }
+
+
+def _iso_day(portal_date: str) -> Optional[str]:
+    """dd-mm-yyyy -> yyyy-mm-dd (None if unparseable)"""
+    try:
+        return datetime.strptime(portal_date, "%d-%m-%Y").strftime("%Y-%m-%d")
+    except (TypeError, ValueError):
+        return None
+
+
+class RollupIndex:
+    """
+    Materialized area totals stored next to the school results
+
+    rollup_entries holds each school's contribution per product and day;
+    rollups holds the sums per level, area, product and day. Storing a
+    record subtracts the school's previous contribution for that day (if
+    any) and adds the new one, so each update touches a handful of rows
+    however large the roster is. The caller owns the connection and commits.
+    """
+
+    def __init__(self, conn: sqlite3.Connection, roster: Optional[Roster] = None):
+        """
+        Args:
+            conn: Open connection (shared with ResultStore)
+            roster: Roster used to look up school areas (defaults to config.SCHOOLS)
+        """
+        self._conn = conn
+        self._roster = roster or Roster.from_config()
+        self._conn.executescript(SCHEMA)
+
+    def _apply(self, areas: Dict[str, str], product: str, day: str, schools: int, values: List[float]):
+        for level in LEVELS:
+            self._conn.execute(_UPSERT, (level, areas[level], product, day, schools, *values))
+
+    def update(self, result: Dict):
+        """
+        Fold one school record into the rollups (call inside the caller's transaction)
+
+        Args:
+            result: School data dictionary from SMPScraper
+        """
+        areas = school_areas(self._roster.get(result['emis']))
+        for product in PRODUCTS:
+            entry = result.get(product)
+            day = _iso_day(entry['date']) if entry else None
+            if day is None:
+                continue
+            values = [float(to_number(entry[field]) or 0) for field in NUMERIC_FIELDS]
+
+            old = self._conn.execute(
+                "SELECT markaz, tehsil, district, received, present, consumption, remaining "
+                "FROM rollup_entries WHERE emis = ? AND product = ? AND day = ?",
+                (result['emis'], product, day)
+            ).fetchone()
+            if old is not None:
+                old_areas = dict(zip(LEVELS, old[:3]))
+                if old_areas == areas and list(old[3:]) == values:
+                    continue
+                self._apply(old_areas, product, day, -1, [-value for value in old[3:]])
+
+            self._apply(areas, product, day, 1, values)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO rollup_entries "
+                "(emis, product, day, markaz, tehsil, district, received, present, consumption, remaining) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (result['emis'], product, day, areas['markaz'], areas['tehsil'], areas['district'], *values)
+            )
+
+    def is_empty(self) -> bool:
+        return self._conn.execute("SELECT 1 FROM rollup_entries LIMIT 1").fetchone() is None
+
+    def summary(self, level: str, day: Optional[str] = None, product: Optional[str] = None) -> List[Dict]:
+        """
+        Totals for every area of a level
+
+        Args:
+            level: 'markaz', 'tehsil' or 'district'
+            day: Day as yyyy-mm-dd (defaults to today)
+            product: 'milk' or 'biscuit' (default: both)
+
+        Returns:
+            Rows with level, area, product, day, schools and the QUANTITIES,
+            ordered by area and product
+        """
+        if level not in LEVELS:
+            raise ValueError(f"Unknown rollup level: {level}")
+        day = day or datetime.now().strftime("%Y-%m-%d")
+        query = ("SELECT level, area, product, day, schools, received, present, consumption, remaining "
+                 "FROM rollups WHERE level = ? AND day = ? AND schools > 0")
+        params = [level, day]
+        if product:
+            query += " AND product = ?"
+            params.append(product)
+        query += " ORDER BY area, product"
+        columns = ('level', 'area', 'product', 'day', 'schools', *QUANTITIES)
+        return [dict(zip(columns, row)) for row in self._conn.execute(query, params).fetchall()]
+
+    def days(self) -> List[str]:
+        """Days with rollups (yyyy-mm-dd), newest first"""
+        rows = self._conn.execute("SELECT DISTINCT day FROM rollups ORDER BY day DESC").fetchall()
+        return [row[0] for row in rows]
@@ -0,0 +1,110 @@
+"""
+School roster index for SMP Portal scraper
+Looks schools up by EMIS code, code prefix/pattern or name
+"""
+
+import bisect
+import fnmatch
+import logging
+from typing import Dict, Iterable, Iterator, List, Optional
+import config
+
+logger = logging.getLogger(__name__)
+
+
+class Roster:
+    """Schools indexed by EMIS code, iterated in their original order"""
+
+    def __init__(self, schools: List[Dict]):
+        """
+        Args:
+            schools: School dictionaries with at least 'emis' and 'name'
+        """
+        self._schools = list(schools)
+        self._by_emis = {school['emis']: school for school in self._schools}
+        self._position = {school['emis']: i for i, school in enumerate(self._schools)}
+        # Sorted codes for prefix range queries
+        self._codes = sorted(self._by_emis)
+
+    @classmethod
+    def from_config(cls) -> 'Roster':
+        """Roster of config.SCHOOLS"""
+        return cls(config.SCHOOLS)
+
+    def __len__(self) -> int:
+        return len(self._schools)
+
+    def __iter__(self) -> Iterator[Dict]:
+        return iter(self._schools)
+
+    def __contains__(self, emis_code: str) -> bool:
+        return emis_code in self._by_emis
+
+    def get(self, emis_code: str) -> Optional[Dict]:
+        """School with this EMIS code, or None"""
+        return self._by_emis.get(emis_code)
+
+    def with_prefix(self, prefix: str) -> List[Dict]:
+        """Schools whose EMIS code starts with prefix, in roster order"""
+        start = bisect.bisect_left(self._codes, prefix)
+        end = bisect.bisect_left(self._codes, prefix + '\uffff')
+        return self._in_order(self._codes[start:end])
+
+    def search_name(self, text: str) -> List[Dict]:
+        """Schools whose name contains text (case-insensitive), in roster order"""
+        text = text.upper()
+        return [school for school in self._schools if text in school['name'].upper()]
+
+    def select(self, patterns: Iterable[str]) -> List[Dict]:
+        """
+        Resolve EMIS codes and patterns to schools
+
+        Each pattern is an exact EMIS code, a prefix ending in '*'
+        (e.g. "3212016*") or a shell-style pattern (e.g. "321201[67]?").
+
+        Args:
+            patterns: Codes or patterns
+
+        Returns:
+            Matching schools in roster order, without duplicates
+        """
+        codes = set()
+        for pattern in patterns:
+            pattern = pattern.strip()
+            if not pattern:
+                continue
+
+            if pattern in self._by_emis:
+                matched = [pattern]
+            elif pattern.endswith('*') and not any(c in pattern[:-1] for c in '*?['):
+                matched = [school['emis'] for school in self.with_prefix(pattern[:-1])]
+            elif any(c in pattern for c in '*?['):
+                matched = fnmatch.filter(self._codes, pattern)
+            else:
+                matched = []
+
+            if not matched:
+                logger.warning(f"No school in roster matches '{pattern}'")
+            codes.update(matched)
+
+        return self._in_order(codes)
+
+    def _in_order(self, codes: Iterable[str]) -> List[Dict]:
+        """Schools for a set of codes, in roster order"""
+        positions = sorted(self._position[code] for code in set(codes))
+        return [self._schools[i] for i in positions]
+
+
+def read_codes_file(path: str) -> List[str]:
+    """
+    Read EMIS codes or patterns from a text file
+
+    Codes may be separated by newlines, commas or whitespace;
+    anything after '#' on a line is ignored.
+    """
+    codes = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.split('#', 1)[0]
+            codes.extend(code for code in line.replace(',', ' ').split() if code)
+    return codes
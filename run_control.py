@@ -0,0 +1,85 @@
+"""
+Run deadlines and cooperative cancellation for SMP Portal scraper
+A CancelToken is shared by the scraper, formatter and GUI for one run
+"""
+
+import threading
+import time
+from typing import Optional
+
+# Shortest timeout handed to a request while the deadline has not yet passed
+MIN_REQUEST_TIMEOUT = 1.0
+
+
+class RunCancelled(Exception):
+    """Raised when a run is cancelled by the user"""
+
+
+class CancelToken:
+    """Cancellation flag plus an optional run deadline"""
+
+    def __init__(self, deadline: Optional[float] = None, deadline_at: Optional[float] = None):
+        """
+        Args:
+            deadline: Seconds from now until the run must stop fetching
+            deadline_at: Absolute deadline as a time.time() timestamp
+                (use this to share one deadline across processes)
+        """
+        if deadline_at is None and deadline is not None:
+            deadline_at = time.time() + deadline
+        self.deadline_at = deadline_at
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        """Request cancellation (safe to call from any thread)"""
+        self._cancelled.set()
+
+    @property
+    def cancelled_by_user(self) -> bool:
+        """True once cancel() has been called"""
+        return self._cancelled.is_set()
+
+    @property
+    def deadline_passed(self) -> bool:
+        """True once the run deadline has passed"""
+        return self.deadline_at is not None and time.time() >= self.deadline_at
+
+    @property
+    def stopped(self) -> bool:
+        """True if no further fetching should start (cancelled or out of time)"""
+        return self.cancelled_by_user or self.deadline_passed
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left before the deadline (None if there is no deadline)"""
+        if self.deadline_at is None:
+            return None
+        return max(0.0, self.deadline_at - time.time())
+
+    def timeout(self, default: float) -> float:
+        """
+        Request timeout clipped to the time left in the run
+
+        Args:
+            default: Normal timeout in seconds (e.g. config.REQUEST_TIMEOUT)
+        """
+        remaining = self.remaining()
+        if remaining is None:
+            return default
+        return max(MIN_REQUEST_TIMEOUT, min(default, remaining))
+
+    def check(self):
+        """Raise RunCancelled if the user cancelled the run"""
+        if self.cancelled_by_user:
+            raise RunCancelled("Run cancelled")
+
+    def wait(self, seconds: float) -> bool:
+        """
+        Sleep for up to seconds, waking early on cancellation
+
+        Returns:
+            True if the run was cancelled while waiting
+        """
+        remaining = self.remaining()
+        if remaining is not None:
+            seconds = min(seconds, remaining)
+        return self._cancelled.wait(seconds)
@@ -3,12 +3,18 @@ Web scraper for SMP Portal using HTTP requests
 Extracts latest milk and biscuit data for all schools
 """
 
+import hashlib
+import re
 import requests
-from bs4 import BeautifulSoup
-import time
+from bs4 import BeautifulSoup, SoupStrainer
 import logging
-from typing import Dict, List, Optional
+from typing import Callable, Dict, Iterable, List, Optional
 import config
+from archive import ResponseArchive
+from roster import Roster
+from run_control import CancelToken
+from phases import phase
+from transport import SUPPORTED_ENCODINGS, TransferStats
 
 # Set up logging - console only
 logging.basicConfig(
@@ -20,20 +26,127 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Responses worth retrying after a pause (rate limited or server trouble)
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Laravel's "page expired" status - the CSRF token is no longer valid
+CSRF_EXPIRED = 419
+
+# Bump when parse_school_response() changes, so stored records are re-parsed
+PARSER_VERSION = 1
+
+# Parts of a detail-report response that change between requests while the
+# tables stay the same: CSRF tokens (meta tag, hidden inputs, inline scripts)
+# and clock times such as "Generated at 10:42:07 AM"
+_VOLATILE = re.compile(
+    rb'<meta[^>]*csrf[^>]*>'
+    rb'|<input[^>]*name=["\']_token["\'][^>]*>'
+    rb'|["\']?(?:_token|csrf[-_]?token)["\']?\s*[:=]\s*["\'][^"\']*["\']'
+    rb'|(?<!\d)\d{1,2}:\d{2}(?::\d{2}(?:\.\d+)?)?(?:\s?[AaPp][Mm])?',
+    re.IGNORECASE
+)
+
+
+def _retry_delay(response: Optional[requests.Response], base: float, attempt: int, limit: float) -> float:
+    """
+    Pause before the next attempt: the server's Retry-After, else exponential backoff
+
+    Args:
+        limit: Longest pause allowed (RETRY_AFTER_MAX, or less when the run's
+            deadline is closer)
+    """
+    delay = base * (2 ** (attempt - 1))
+    if response is not None:
+        retry_after = response.headers.get('Retry-After', '')
+        if retry_after.isdigit():
+            delay = float(retry_after)
+            if delay > limit:
+                logger.warning(f"  Server asked to retry after {retry_after}s - waiting {limit:.0f}s instead")
+    return min(delay, limit)
+
 
 class SMPScraper:
     """Scraper for School Meal Program Portal"""
     
-    def __init__(self):
+    def __init__(self, archive: Optional[ResponseArchive] = None, token: Optional[CancelToken] = None,
+                 base_url: Optional[str] = None):
+        """
+        Args:
+            archive: Where to save raw detail-report responses
+                (defaults to today's archive when config.ARCHIVE_RESPONSES is set)
+            token: Cancellation token / run deadline shared with the caller
+            base_url: Portal to talk to instead of config.PORTAL_URL
+                (e.g. a local mock_portal.MockPortal)
+        """
+        self.token = token or CancelToken()
+        if archive is None and config.ARCHIVE_RESPONSES:
+            archive = ResponseArchive()
+        self.archive = archive
+        
+        if base_url:
+            self.portal_url = base_url.rstrip('/')
+            self.login_url = f"{self.portal_url}/login"
+            self.detail_report_url = f"{self.portal_url}/detail-report"
+        else:
+            self.portal_url = config.PORTAL_URL
+            self.login_url = config.LOGIN_URL
+            self.detail_report_url = config.DETAIL_REPORT_URL
+        
+        # Tunables (the load test overrides these)
+        self.retry_attempts = max(1, config.RETRY_ATTEMPTS)
+        self.retry_delay = config.RETRY_DELAY
+        self.request_delay = config.REQUEST_DELAY
+        self.retries = 0  # retries made so far, for reporting
+        
+        # Earlier records with a 'fingerprint', by EMIS code (see remember())
+        self.known: Dict[str, Dict] = {}
+        self.parses_skipped = 0  # unchanged responses whose record was reused
+        
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': config.USER_AGENT,
             'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8',
             'Accept-Language': 'en-US,en;q=0.9',
-            'Accept-Encoding': 'gzip, deflate, br',
+            # Only encodings urllib3 can decode here (br needs the optional brotli package)
+            'Accept-Encoding': SUPPORTED_ENCODINGS,
             'Connection': 'keep-alive',
         })
-        self.csrf_token = None
+        self.csrf_token = None  # session CSRF token, reused for every detail-report request
+        self.transfer = TransferStats()  # bytes sent/received, for the data-usage report
+    
+    def _request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        Send a request, retrying dropped connections, timeouts and RETRY_STATUSES
+        
+        Up to self.retry_attempts attempts are made, pausing between them as
+        the server asks (Retry-After) or with exponential backoff. The last
+        response is returned whatever its status.
+        
+        Raises:
+            requests.RequestException when every attempt failed to get a response,
+            or the run was stopped while waiting to retry
+        """
+        for attempt in range(1, self.retry_attempts + 1):
+            response = None
+            try:
+                response = self.session.request(
+                    method, url, timeout=self.token.timeout(config.REQUEST_TIMEOUT), **kwargs
+                )
+                self.transfer.record(response)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self.transfer.record_failure()
+                if attempt == self.retry_attempts or self.token.stopped:
+                    raise
+                logger.warning(f"  {method} {url} failed ({e.__class__.__name__}) - retrying")
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt == self.retry_attempts:
+                    return response
+                logger.warning(f"  {method} {url} returned {response.status_code} - retrying")
+            
+            self.retries += 1
+            delay = _retry_delay(response, self.retry_delay, attempt, self.token.timeout(config.RETRY_AFTER_MAX))
+            if self.token.wait(delay) or self.token.stopped:
+                raise requests.RequestException("Run stopped while waiting to retry")
         
     def _get_csrf_token(self, html: str) -> Optional[str]:
         """Extract CSRF token from HTML"""
@@ -53,10 +166,15 @@ class SMPScraper:
         Login to the portal and maintain session
         Returns True if successful, False otherwise
         """
+        with phase('login'):
+            return self._login()
+    
+    def _login(self) -> bool:
+        """Login request sequence (see login())"""
         try:
             # IMPORTANT: Must visit base URL first, not /login directly!
             logger.info("Fetching portal home page to get CSRF token...")
-            response = self.session.get(config.PORTAL_URL, timeout=config.REQUEST_TIMEOUT)
+            response = self._request('GET', self.portal_url)
             response.raise_for_status()
             
             # Extract CSRF token
@@ -75,17 +193,14 @@ class SMPScraper:
             }
             
             logger.info(f"Logging in with username: {config.USERNAME}")
-            response = self.session.post(
-                config.LOGIN_URL,
-                data=login_data,
-                timeout=config.REQUEST_TIMEOUT,
-                allow_redirects=True
-            )
+            response = self._request('POST', self.login_url, data=login_data, allow_redirects=True)
             response.raise_for_status()
             
             # Check if login was successful - should redirect to dashboard
             if 'dashboard' in response.url.lower() or config.USERNAME.upper() in response.text.upper():
                 logger.info(f"Login successful! Redirected to: {response.url}")
+                # The dashboard carries the session's token, saving a page load per school
+                self.csrf_token = _meta_csrf_token(response.content)
                 return True
             else:
                 logger.error("Login failed - not redirected to dashboard")
@@ -98,7 +213,62 @@ class SMPScraper:
             logger.error(f"Unexpected error during login: {e}")
             return False
     
-    def _extract_latest_table_data(self, soup: BeautifulSoup, table_title: str) -> Optional[Dict]:
+    @staticmethod
+    def _find_table_rows(soup: BeautifulSoup, table_title: str) -> Optional[List]:
+        """
+        Data rows (<tr> in <tbody>) of the summary table with the given title
+        
+        Returns:
+            List of row tags, or None (with a warning) if the table is missing or empty
+        """
+        # Find the card with the specific header title
+        headers = soup.find_all('h4', class_='header-title')
+        target_card = None
+        
+        for header in headers:
+            if table_title in header.text:
+                target_card = header.find_parent('div', class_='card-body')
+                break
+        
+        if not target_card:
+            logger.warning(f"Table '{table_title}' not found")
+            return None
+        
+        # Find the table within this card
+        table = target_card.find('table')
+        if not table:
+            logger.warning(f"No table found in '{table_title}' section")
+            return None
+        
+        # Get all data rows (skip header)
+        tbody = table.find('tbody')
+        if not tbody:
+            logger.warning(f"No tbody found in '{table_title}' table")
+            return None
+        
+        rows = tbody.find_all('tr')
+        if not rows:
+            logger.warning(f"No data rows found in '{table_title}' table")
+            return None
+        return rows
+    
+    @staticmethod
+    def _row_data(row) -> Optional[Dict]:
+        """Cell values of one summary table row (None if it has fewer than 6 cells)"""
+        cells = row.find_all('td')
+        if len(cells) < 6:
+            return None
+        return {
+            'sr': cells[0].text.strip(),
+            'date': cells[1].text.strip(),
+            'received_quantity': cells[2].text.strip(),
+            'present_stock': cells[3].text.strip(),
+            'consumption': cells[4].text.strip(),
+            'remaining_balance': cells[5].text.strip()
+        }
+    
+    @staticmethod
+    def _extract_latest_table_data(soup: BeautifulSoup, table_title: str) -> Optional[Dict]:
         """
         Extract the LAST (latest) entry from a table
         
@@ -110,100 +280,56 @@ class SMPScraper:
             Dictionary with the latest row data or None if not found
         """
         try:
-            # Find the card with the specific header title
-            headers = soup.find_all('h4', class_='header-title')
-            target_card = None
-            
-            for header in headers:
-                if table_title in header.text:
-                    target_card = header.find_parent('div', class_='card-body')
-                    break
-            
-            if not target_card:
-                logger.warning(f"Table '{table_title}' not found")
-                return None
-            
-            # Find the table within this card
-            table = target_card.find('table')
-            if not table:
-                logger.warning(f"No table found in '{table_title}' section")
-                return None
-            
-            # Get all data rows (skip header)
-            tbody = table.find('tbody')
-            if not tbody:
-                logger.warning(f"No tbody found in '{table_title}' table")
-                return None
-            
-            rows = tbody.find_all('tr')
+            rows = SMPScraper._find_table_rows(soup, table_title)
             if not rows:
-                logger.warning(f"No data rows found in '{table_title}' table")
                 return None
             
             # Get the LAST row (latest data)
-            last_row = rows[-1]
-            cells = last_row.find_all('td')
-            
-            if len(cells) < 6:
+            data = SMPScraper._row_data(rows[-1])
+            if data is None:
                 logger.warning(f"Incomplete data in '{table_title}' table")
-                return None
-            
-            # Extract data from cells
-            data = {
-                'sr': cells[0].text.strip(),
-                'date': cells[1].text.strip(),
-                'received_quantity': cells[2].text.strip(),
-                'present_stock': cells[3].text.strip(),
-                'consumption': cells[4].text.strip(),
-                'remaining_balance': cells[5].text.strip()
-            }
-            
             return data
             
         except Exception as e:
             logger.error(f"Error extracting data from '{table_title}': {e}")
             return None
     
-    def get_school_data(self, emis_code: str, school_name: str) -> Dict:
+    @staticmethod
+    def _extract_table_history(soup: BeautifulSoup, table_title: str) -> List[Dict]:
         """
-        Get latest milk and biscuit data for a specific school
+        Extract every complete entry from a table, oldest first
+        
+        Returns:
+            List of row dictionaries (empty if the table is missing)
+        """
+        try:
+            rows = SMPScraper._find_table_rows(soup, table_title) or []
+            return [data for data in map(SMPScraper._row_data, rows) if data]
+        except Exception as e:
+            logger.error(f"Error extracting history from '{table_title}': {e}")
+            return []
+    
+    def fetch_school_response(self, emis_code: str) -> Optional[bytes]:
+        """
+        Fetch the raw detail-report (AJAX) response for a school
         
         Args:
             emis_code: EMIS code of the school
-            school_name: Name of the school
         
-        Returns:
-            Dictionary with school data
-        """
-        logger.info(f"Fetching data for {emis_code} - {school_name}")
+        The session's CSRF token is reused across schools; the detail-report
+        page is only loaded when there is no token yet or the portal rejects it.
         
-        result = {
-            'emis': emis_code,
-            'name': school_name,
-            'milk': None,
-            'biscuit': None
-        }
+        Returns:
+            Raw response body, or None if no CSRF token could be obtained
         
-        try:
-            # First, visit the detail-report page to get a fresh CSRF token
-            logger.info("  Getting detail-report page for fresh CSRF token...")
-            page_response = self.session.get(config.DETAIL_REPORT_URL, timeout=config.REQUEST_TIMEOUT)
-            page_response.raise_for_status()
-            
-            # Extract CSRF token - try meta tag first (preferred for authenticated pages)
-            soup_temp = BeautifulSoup(page_response.text, 'lxml')
-            meta_csrf = soup_temp.find('meta', {'name': 'csrf-token'})
-            
-            if meta_csrf and meta_csrf.get('content'):
-                fresh_csrf = meta_csrf.get('content')
-                logger.info("  Using CSRF token from meta tag")
-            else:
-                # Fall back to hidden input
-                fresh_csrf = self._get_csrf_token(page_response.text)
-                if not fresh_csrf:
-                    logger.error("  Failed to get CSRF token from detail-report page")
-                    return result
-                logger.info("  Using CSRF token from hidden input")
+        Raises:
+            requests.RequestException on network or HTTP errors
+        """
+        for attempt in range(1, self.retry_attempts + 1):
+            if not self.csrf_token:
+                self.csrf_token = self._detail_report_token()
+                if not self.csrf_token:
+                    return None
             
             # Prepare POST data to filter by school
             post_data = {
@@ -218,68 +344,282 @@ class SMPScraper:
             # Make POST request to get school data (AJAX call)
             headers = {
                 'Content-Type': 'application/json',
-                'X-CSRF-TOKEN': fresh_csrf,
+                'X-CSRF-TOKEN': self.csrf_token,
                 'X-Requested-With': 'XMLHttpRequest',
                 'Accept': 'text/html, */*; q=0.01',
-                'Referer': config.DETAIL_REPORT_URL
+                'Referer': self.detail_report_url
             }
             
             logger.info(f"  Making AJAX request for school data...")
-            response = self.session.post(
-                config.DETAIL_REPORT_URL,
-                json=post_data,
-                headers=headers,
-                timeout=config.REQUEST_TIMEOUT
-            )
+            response = self._request('POST', self.detail_report_url, json=post_data, headers=headers)
+            if response.status_code == CSRF_EXPIRED and attempt < self.retry_attempts:
+                # Token expired (or rotated) - get a new one
+                logger.warning("  CSRF token expired (419) - fetching a fresh one")
+                self.csrf_token = None
+                self.retries += 1
+                continue
             response.raise_for_status()
+            return response.content
+    
+    def _detail_report_token(self) -> Optional[str]:
+        """Fresh CSRF token from the detail-report page (None if not found)"""
+        logger.info("  Getting detail-report page for fresh CSRF token...")
+        page_response = self._request('GET', self.detail_report_url)
+        page_response.raise_for_status()
+        
+        # Extract CSRF token - try meta tag first (preferred for authenticated pages)
+        fresh_csrf = _meta_csrf_token(page_response.content)
+        if fresh_csrf:
+            logger.info("  Using CSRF token from meta tag")
+        else:
+            # Fall back to hidden input
+            fresh_csrf = self._get_csrf_token(page_response.text)
+            if not fresh_csrf:
+                logger.error("  Failed to get CSRF token from detail-report page")
+                return None
+            logger.info("  Using CSRF token from hidden input")
+        return fresh_csrf
+    
+    def remember(self, records: Iterable[Dict]):
+        """
+        Records from earlier runs (e.g. ResultStore.load().values())
+        
+        A school whose response has the same fingerprint as its remembered
+        record reuses that record instead of being parsed again.
+        """
+        for record in records:
+            if record.get('fingerprint'):
+                self.known[record['emis']] = record
+    
+    def reuse_unchanged(self, emis_code: str, school_name: str, fingerprint: str) -> Optional[Dict]:
+        """
+        Copy of the remembered record for a school if its response is unchanged
+        
+        Returns:
+            School data dictionary, or None if the response has to be parsed
+        """
+        known = self.known.get(emis_code)
+        if known is None or known['fingerprint'] != fingerprint:
+            return None
+        self.parses_skipped += 1
+        logger.info("  Response unchanged - reusing the parsed record")
+        result = empty_school_result(emis_code, school_name)
+        for product in ('milk', 'biscuit'):
+            result[product] = dict(known[product]) if known.get(product) else None
+        result['fingerprint'] = fingerprint
+        return result
+    
+    def archive_response(self, emis_code: str, body: bytes):
+        """
+        Save a raw response to the archive (if any)
+        
+        A failed write (disk full, permissions) is only logged: the response
+        was fetched fine and is still parsed.
+        """
+        if not self.archive:
+            return
+        try:
+            self.archive.save(emis_code, body)
+        except OSError as e:
+            logger.warning(f"Could not archive the response for {emis_code}: {e}")
+    
+    def get_school_data(self, emis_code: str, school_name: str) -> Dict:
+        """
+        Get latest milk and biscuit data for a specific school
+        
+        Args:
+            emis_code: EMIS code of the school
+            school_name: Name of the school
+        
+        Returns:
+            Dictionary with school data
+        """
+        with phase(f'school:{emis_code}'):
+            return self._get_school_data(emis_code, school_name)
+    
+    def _get_school_data(self, emis_code: str, school_name: str) -> Dict:
+        """Fetch, archive and parse one school (see get_school_data())"""
+        logger.info(f"Fetching data for {emis_code} - {school_name}")
+        
+        result = empty_school_result(emis_code, school_name)
+        
+        try:
+            body = self.fetch_school_response(emis_code)
+            if body is None:
+                result['error'] = True
+                return result
             
-            # Parse the response
-            soup = BeautifulSoup(response.text, 'lxml')
-            
-            # Extract milk data (last entry)
-            milk_data = self._extract_latest_table_data(soup, "Summary Date Wise (Milk)")
-            if milk_data:
-                result['milk'] = milk_data
-                logger.info(f"  Milk data: {milk_data['date']}")
-            else:
-                logger.warning(f"  No milk data found for {emis_code}")
+            # Keep the raw response so the report can be rebuilt offline
+            self.archive_response(emis_code, body)
             
-            # Extract biscuit data (last entry)
-            biscuit_data = self._extract_latest_table_data(soup, "Summary Date Wise (Biscuit)")
-            if biscuit_data:
-                result['biscuit'] = biscuit_data
-                logger.info(f"  Biscuit data: {biscuit_data['date']}")
-            else:
-                logger.warning(f"  No biscuit data found for {emis_code}")
+            fingerprint = response_fingerprint(body)
+            result = self.reuse_unchanged(emis_code, school_name, fingerprint)
+            if result is None:
+                result = parse_school_response(body, emis_code, school_name)
+                result['fingerprint'] = fingerprint
+                self.known[emis_code] = result
+            del body
             
             # Small delay to avoid overwhelming the server
-            time.sleep(0.5)
+            self.token.wait(self.request_delay)
             
         except requests.RequestException as e:
-            logger.error(f"Request failed for {emis_code}: {e}")
+            if self.token.stopped:
+                # The request was cut short by the deadline or a cancel - not a portal failure
+                logger.warning(f"Stopped while fetching {emis_code}: {e}")
+                result['skipped'] = True
+            else:
+                logger.error(f"Request failed for {emis_code}: {e}")
+                result['error'] = True
         except Exception as e:
             logger.error(f"Unexpected error for {emis_code}: {e}")
+            result = empty_school_result(emis_code, school_name)
+            result['error'] = True
         
         return result
     
-    def scrape_all_schools(self) -> List[Dict]:
+    def scrape_all_schools(self, on_result: Optional[Callable[[Dict], None]] = None,
+                           schools: Optional[List[Dict]] = None) -> List[Dict]:
         """
         Scrape data for all schools defined in config
         
+        Args:
+            on_result: Optional callback invoked with each school's data as soon
+                as it is fetched (e.g. to stream exports during the scrape)
+            schools: Scrape only these schools instead of config.SCHOOLS
+        
         Returns:
-            List of dictionaries containing school data
+            List of dictionaries containing school data. If the run is cancelled
+            or its deadline passes, the schools not fetched are still listed,
+            with 'skipped': True. Schools whose fetch or parse failed are listed
+            with 'error': True. on_result is called for neither, so a failure
+            never replaces a school's last good record.
         """
-        logger.info("Starting to scrape all schools...")
+        schools = config.SCHOOLS if schools is None else schools
+        logger.info(f"Starting to scrape {len(schools)} schools...")
         all_data = []
         
-        for school in config.SCHOOLS:
+        for school in schools:
+            if self.token.stopped:
+                data = empty_school_result(school['emis'], school['name'])
+                data['skipped'] = True
+                all_data.append(data)
+                continue
+            
             data = self.get_school_data(school['emis'], school['name'])
             all_data.append(data)
+            if on_result and not data.get('skipped') and not data.get('error'):
+                on_result(data)
         
-        logger.info(f"Completed scraping {len(all_data)} schools")
+        skipped = sum(1 for data in all_data if data.get('skipped'))
+        if skipped:
+            reason = "cancelled" if self.token.cancelled_by_user else "deadline reached"
+            logger.warning(f"Run stopped ({reason}) - {skipped} schools not fetched")
+        
+        logger.info(f"Completed scraping {len(all_data) - skipped} schools")
+        if self.parses_skipped:
+            logger.info(f"{self.parses_skipped} unchanged responses were not parsed again")
         return all_data
 
 
+def _meta_csrf_token(body) -> Optional[str]:
+    """
+    CSRF token from a page's <meta name="csrf-token"> tag (None if absent)
+    
+    Only <meta> tags are parsed, and the tree is released straight away.
+    """
+    soup = BeautifulSoup(body, 'lxml', parse_only=SoupStrainer('meta'))
+    meta_csrf = soup.find('meta', {'name': 'csrf-token'})
+    token = meta_csrf.get('content') if meta_csrf else None
+    soup.decompose()
+    return token
+
+
+def empty_school_result(emis_code: str, school_name: str) -> Dict:
+    """School data dictionary with no milk or biscuit entry"""
+    return {
+        'emis': emis_code,
+        'name': school_name,
+        'milk': None,
+        'biscuit': None
+    }
+
+
+def response_fingerprint(body: bytes) -> str:
+    """
+    SHA-256 of a detail-report response with its volatile parts removed
+    
+    Responses with the same fingerprint hold the same tables, so a record
+    parsed from one stands in for the other.
+    """
+    digest = hashlib.sha256(b'v%d:' % PARSER_VERSION)
+    digest.update(_VOLATILE.sub(b'', body))
+    return digest.hexdigest()
+
+
+def parse_school_response(body, emis_code: str, school_name: str) -> Dict:
+    """
+    Extract the latest milk and biscuit entries from a detail-report response
+    
+    Module-level (no session needed) so that archived responses can be
+    re-parsed offline and in worker processes.
+    
+    Args:
+        body: Raw response body (bytes or str)
+        emis_code: EMIS code of the school
+        school_name: Name of the school
+    
+    Returns:
+        Dictionary with school data
+    """
+    result = empty_school_result(emis_code, school_name)
+    
+    # Parse only the summary cards; the rest of the page is never built into the tree
+    soup = BeautifulSoup(body, 'lxml', parse_only=SoupStrainer('div', class_='card-body'))
+    
+    try:
+        # Extract milk data (last entry)
+        milk_data = SMPScraper._extract_latest_table_data(soup, "Summary Date Wise (Milk)")
+        if milk_data:
+            result['milk'] = milk_data
+            logger.info(f"  Milk data: {milk_data['date']}")
+        else:
+            logger.warning(f"  No milk data found for {emis_code}")
+        
+        # Extract biscuit data (last entry)
+        biscuit_data = SMPScraper._extract_latest_table_data(soup, "Summary Date Wise (Biscuit)")
+        if biscuit_data:
+            result['biscuit'] = biscuit_data
+            logger.info(f"  Biscuit data: {biscuit_data['date']}")
+        else:
+            logger.warning(f"  No biscuit data found for {emis_code}")
+    finally:
+        # BeautifulSoup trees are full of parent/sibling reference cycles. The extracted
+        # values are plain strings, so break the tree apart now: reference counting then
+        # frees it straight away, without a full gc.collect() per school.
+        soup.decompose()
+    
+    return result
+
+
+def parse_school_history(body, emis_code: str, school_name: str) -> Dict:
+    """
+    Extract the full milk and biscuit history from a detail-report response
+    
+    Like parse_school_response(), but 'milk' and 'biscuit' are lists with
+    every row of the summary tables (oldest first) instead of the latest row.
+    """
+    result = empty_school_result(emis_code, school_name)
+    soup = BeautifulSoup(body, 'lxml', parse_only=SoupStrainer('div', class_='card-body'))
+    try:
+        result['milk'] = SMPScraper._extract_table_history(soup, "Summary Date Wise (Milk)")
+        result['biscuit'] = SMPScraper._extract_table_history(soup, "Summary Date Wise (Biscuit)")
+    finally:
+        # See parse_school_response()
+        soup.decompose()
+    return result
+
+
 def test_login():
     """Test login functionality"""
     scraper = SMPScraper()
@@ -300,8 +640,8 @@ def test_single_school(emis_code: str):
         print("Login failed!")
         return False
     
-    # Find the school in config
-    school = next((s for s in config.SCHOOLS if s['emis'] == emis_code), None)
+    # Find the school in the roster
+    school = Roster.from_config().get(emis_code)
     if not school:
         print(f"School {emis_code} not found in config!")
         return False
@@ -0,0 +1,140 @@
+"""
+Sharded multi-process scraping for SMP Portal scraper
+Splits a roster across worker processes that share one result store
+"""
+
+import logging
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+import config
+from archive import ResponseArchive
+from result_store import ResultStore
+from run_control import CancelToken
+from scraper import SMPScraper, empty_school_result
+
+logger = logging.getLogger(__name__)
+
+
+def split_shards(schools: List[Dict], shards: int) -> List[List[Dict]]:
+    """
+    Split a roster into contiguous, near-equal shards
+
+    Args:
+        schools: Schools to split
+        shards: Number of shards wanted
+
+    Returns:
+        Non-empty shards, in roster order
+    """
+    shards = max(1, min(shards, len(schools)))
+    size, extra = divmod(len(schools), shards)
+    result = []
+    start = 0
+    for i in range(shards):
+        end = start + size + (1 if i < extra else 0)
+        result.append(schools[start:end])
+        start = end
+    return [shard for shard in result if shard]
+
+
+def _run_shard(index: int, schools: List[Dict], db_path: str, deadline_at: Optional[float],
+               base_url: Optional[str] = None, archive_root: Optional[str] = None) -> Tuple[int, Dict[str, str]]:
+    """
+    Scrape one shard in a worker process
+
+    Each worker logs in with its own session and writes every result to the
+    shared store as soon as it is fetched.
+
+    Returns:
+        (shard index, EMIS code -> 'ok', 'error' (fetch or login failed) or
+        'skipped' (not fetched before the deadline))
+    """
+    logging.basicConfig(level=logging.INFO, format=f'%(asctime)s - shard {index} - %(levelname)s - %(message)s')
+
+    archive = ResponseArchive(archive_root) if config.ARCHIVE_RESPONSES else None
+    token = CancelToken(deadline_at=deadline_at)
+    scraper = SMPScraper(archive=archive, token=token, base_url=base_url)
+    if not scraper.login():
+        logger.error(f"Shard {index}: login failed - {len(schools)} schools not fetched")
+        status = 'skipped' if token.stopped else 'error'
+        return index, {school['emis']: status for school in schools}
+
+    store = ResultStore(db_path)
+    scraper.remember(store.load(school['emis'] for school in schools).values())
+
+    def save(result: Dict):
+        if not result.get('error'):
+            store.save(result)
+
+    try:
+        results = scraper.scrape_all_schools(on_result=save, schools=schools)
+    finally:
+        store.close()
+    return index, {
+        result['emis']: 'skipped' if result.get('skipped') else 'error' if result.get('error') else 'ok'
+        for result in results
+    }
+
+
+def run_sharded(schools: List[Dict], shards: int, db_path: Optional[str] = None,
+                deadline_at: Optional[float] = None, base_url: Optional[str] = None,
+                archive_root: Optional[str] = None) -> List[Dict]:
+    """
+    Scrape a roster with one worker process per shard and merge the results
+
+    Args:
+        schools: Schools to scrape
+        shards: Number of worker processes
+        db_path: Shared SQLite result store (defaults to config.RESULT_DB)
+        deadline_at: Run deadline as a time.time() timestamp
+        base_url: Portal to scrape instead of config.PORTAL_URL
+        archive_root: Response archive for the workers (defaults to config.ARCHIVE_DIR,
+            resolved here so that workers started with spawn use the same one)
+
+    Returns:
+        School data dictionaries in roster order, read back from the store.
+        Schools not fetched before the deadline are marked 'skipped': True,
+        failed fetches (including a shard's failed login) 'error': True.
+    """
+    db_path = db_path or config.RESULT_DB
+    archive_root = archive_root or config.ARCHIVE_DIR
+    parts = split_shards(schools, shards)
+    started = datetime.now().isoformat(timespec='seconds')
+    logger.info(f"Scraping {len(schools)} schools in {len(parts)} shard(s)...")
+
+    # Make sure the schema exists before workers race to create it
+    ResultStore(db_path).close()
+
+    statuses: Dict[str, str] = {}
+    with ProcessPoolExecutor(max_workers=len(parts)) as pool:
+        futures = {
+            pool.submit(_run_shard, index, part, db_path, deadline_at, base_url, archive_root): part
+            for index, part in enumerate(parts)
+        }
+        for future in as_completed(futures):
+            try:
+                index, shard_statuses = future.result()
+                stored = sum(1 for status in shard_statuses.values() if status == 'ok')
+                logger.info(f"Shard {index} finished: {stored}/{len(shard_statuses)} schools stored")
+                statuses.update(shard_statuses)
+            except Exception as e:
+                logger.error(f"Shard worker failed: {e}")
+                statuses.update((school['emis'], 'error') for school in futures[future])
+
+    # Single merge pass over the shared store
+    store = ResultStore(db_path)
+    try:
+        results = store.load(school['emis'] for school in schools)
+    finally:
+        store.close()
+
+    merged = []
+    for school in schools:
+        result = results.get(school['emis'])
+        status = statuses.get(school['emis'], 'error')
+        if status != 'ok' or result is None or result['fetched_at'] < started:
+            result = empty_school_result(school['emis'], school['name'])
+            result['skipped' if status == 'skipped' else 'error'] = True
+        merged.append(result)
+    return merged
@@ -0,0 +1,116 @@
+"""
+HTTP transfer accounting for SMP Portal scraper
+Negotiates only the content encodings that can be decoded here and counts
+the bytes each request sends and receives, on the wire and decoded
+"""
+
+import threading
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+import requests
+from urllib3.util.request import ACCEPT_ENCODING
+from phases import current, phase_label
+
+# What urllib3 can decode in this environment: gzip and deflate always,
+# br only when brotli is installed, zstd only when zstandard is
+SUPPORTED_ENCODINGS = ACCEPT_ENCODING.replace(',', ', ')
+
+
+def _headers_size(headers) -> int:
+    """Approximate size of a header block ("Name: value\\r\\n" per header)"""
+    return sum(len(name) + len(value) + 4 for name, value in headers.items()) + 2
+
+
+def _kb(value: int) -> str:
+    return f"{value / 1024:.1f} KB"
+
+
+class TransferStats:
+    """
+    Bytes sent and received per request and per run phase
+
+    'wire' counts what crossed the network (compressed body plus headers),
+    'decoded' the bodies after decompression. Header sizes are estimates;
+    TLS and TCP overhead are not included.
+    """
+
+    def __init__(self):
+        self.requests: List[Dict] = []
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    def record(self, response: requests.Response):
+        """
+        Account for a completed response (and any redirects before it)
+
+        The body must already have been read (the default for non-streamed requests).
+        """
+        label = phase_label(current())
+        for hop in [*response.history, response]:
+            request = hop.request
+            body = request.body or b''
+            sent = (len(request.method) + len(request.path_url) + 12
+                    + _headers_size(request.headers) + len(body))
+            decoded = len(hop.content or b'')
+            # Raw bytes read from the socket before decompression
+            wire_body = hop.raw.tell() if hop.raw is not None else decoded
+            with self._lock:
+                self.requests.append({
+                    'phase': label,
+                    'method': request.method,
+                    'path': urlsplit(request.url).path or '/',
+                    'status': hop.status_code,
+                    'encoding': hop.headers.get('Content-Encoding', 'identity'),
+                    'sent': sent,
+                    'wire': 15 + _headers_size(hop.headers) + wire_body,
+                    'wire_body': wire_body,
+                    'decoded': decoded,
+                })
+
+    def record_failure(self):
+        """Count a request that got no response (dropped connection, timeout)"""
+        with self._lock:
+            self.failures += 1
+
+    def totals(self, phase: Optional[str] = None) -> Dict[str, int]:
+        """Summed counters, for one phase label or the whole run"""
+        with self._lock:
+            records = [r for r in self.requests if phase is None or r['phase'] == phase]
+        totals = {'requests': len(records)}
+        for key in ('sent', 'wire', 'wire_body', 'decoded'):
+            totals[key] = sum(r[key] for r in records)
+        return totals
+
+    def report(self) -> str:
+        """Data-usage summary: totals, per phase and content encodings seen"""
+        total = self.totals()
+        lines = [
+            f"Data usage: {_kb(total['sent'] + total['wire'])} transferred "
+            f"({_kb(total['sent'])} sent, {_kb(total['wire'])} received) in {total['requests']} requests",
+            f"Response bodies: {_kb(total['wire_body'])} on the wire, {_kb(total['decoded'])} decoded"
+            + (f" ({total['decoded'] / total['wire_body']:.1f}x compression)" if total['wire_body'] else ""),
+            f"Accept-Encoding: {SUPPORTED_ENCODINGS}",
+        ]
+        if self.failures:
+            lines.append(f"Requests without a response: {self.failures}")
+
+        lines.append("")
+        lines.append(f"{'phase':<10} {'requests':>8} {'sent':>10} {'received':>10} {'decoded':>10} {'per request':>12}")
+        for label in dict.fromkeys(r['phase'] for r in self.requests):
+            t = self.totals(label)
+            per_request = (t['sent'] + t['wire']) // t['requests'] if t['requests'] else 0
+            lines.append(f"{label:<10} {t['requests']:>8} {_kb(t['sent']):>10} {_kb(t['wire']):>10} "
+                         f"{_kb(t['decoded']):>10} {_kb(per_request):>12}")
+
+        encodings = {}
+        for r in self.requests:
+            encodings[r['encoding']] = encodings.get(r['encoding'], 0) + 1
+        lines.append("")
+        lines.append("Content-Encoding: " + ", ".join(f"{name} x{count}" for name, count in encodings.items()))
+        return "\n".join(lines)
+
+    def summary(self) -> str:
+        """One-line data-usage summary (for the app's log)"""
+        total = self.totals()
+        return (f"Data used: {_kb(total['sent'] + total['wire'])} in {total['requests']} requests "
+                f"({_kb(total['decoded'])} after decompression)")